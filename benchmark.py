@@ -0,0 +1,231 @@
+# -*- Mode: Python -*-
+# Copyright (C) 2019 Rene Sugar
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+# Measures gircheck throughput over the bundled GIR corpus.
+#
+# Every (mode, file) pair runs in a fresh process so peak RSS is per file.
+# Results are written as JSON and can be compared with an earlier run:
+#
+#   python3 -B ./benchmark.py --output=./bench-before.json
+#   python3 -B ./benchmark.py --output=./bench-after.json --compare=./bench-before.json
+
+import glob
+import json
+import multiprocessing
+import optparse
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+# Bump this for *incompatible* changes to the results format
+BENCHMARK_VERSION = 2
+
+ALL_MODES = ['passthrough', 'check', 'typeinfo']
+
+# passthrough and check read the unmodified files, typeinfo reads the fixed ones
+MODE_CORPUS = {
+    'passthrough': 'original-gir-files',
+    'check': 'original-gir-files',
+    'typeinfo': 'gir-files',
+}
+
+def _run_file(task):
+    mode, path, exclude_registered = task
+
+    # Imported here so the parent process stays small
+    import gircheck
+    from memorytrace import peak_rss_kb
+
+    # Every mode runs the per-file entry point of a gircheck run, including writing its output
+    with tempfile.TemporaryDirectory() as output_path:
+        start_time = time.perf_counter()
+        if mode == 'typeinfo':
+            fragment = gircheck._generate_typeinfo((gircheck.TypeinfoContext('typeinfo'), path))
+            wall_time = time.perf_counter() - start_time
+            output_size = sum(len(source) for filename, source in fragment.sources)
+        else:
+            context = gircheck.GIRCheckContext(output_path, passthrough=(mode == 'passthrough'),
+                                               exclude_registered=exclude_registered)
+            result = gircheck._check_gir_file((context, path))
+            wall_time = time.perf_counter() - start_time
+            if result.error is not None:
+                raise RuntimeError('%s: %s' % (path, result.error))
+            output_size = os.path.getsize(context.output_filename(path))
+        rss_kb = peak_rss_kb()
+
+    # Parsed again afterwards so it does not add to the peak RSS
+    start_time = time.perf_counter()
+    namespace = gircheck.parse_gir(path)
+    parse_time = time.perf_counter() - start_time
+
+    return _result(mode, path, output_size, len(namespace.values()), parse_time, wall_time, rss_kb)
+
+def _result(mode, path, output_size, nodes, parse_time, wall_time, rss_kb):
+    return {
+        'mode': mode,
+        'file': os.path.basename(path),
+        'input_bytes': os.path.getsize(path),
+        'output_bytes': output_size,
+        'nodes': nodes,
+        'parse_time': parse_time,
+        'wall_time': wall_time,
+        'nodes_per_second': nodes / wall_time if wall_time > 0 else None,
+        'bytes_per_second': os.path.getsize(path) / wall_time if wall_time > 0 else None,
+        'peak_rss_kb': rss_kb,
+    }
+
+def _git_commit(path):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=path,
+                                       stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _totals(results):
+    totals = {}
+    for result in results:
+        total = totals.setdefault(result['mode'], {'files': 0, 'input_bytes': 0, 'nodes': 0,
+                                                   'wall_time': 0.0, 'peak_rss_kb': 0})
+        total['files'] += 1
+        total['input_bytes'] += result['input_bytes']
+        total['nodes'] += result['nodes']
+        total['wall_time'] += result['wall_time']
+        total['peak_rss_kb'] = max(total['peak_rss_kb'], result['peak_rss_kb'] or 0)
+    for total in totals.values():
+        if total['wall_time'] > 0:
+            total['nodes_per_second'] = total['nodes'] / total['wall_time']
+            total['bytes_per_second'] = total['input_bytes'] / total['wall_time']
+    return totals
+
+def run_benchmark(root_path, modes, exclude_registered, repeat=1):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for mode in modes:
+        filenames = sorted(glob.glob(os.path.join(root_path, MODE_CORPUS[mode], '*.gir')))
+        for path in filenames:
+            best = None
+            for i in range(repeat):
+                # A new process per run so ru_maxrss is the peak for this file
+                with context.Pool(processes=1, maxtasksperchild=1) as pool:
+                    result = pool.apply(_run_file, ((mode, path, exclude_registered),))
+                if best is None or result['wall_time'] < best['wall_time']:
+                    best = result
+            sys.stderr.write('%-12s %-36s %8.3fs %8s KB\n' % (mode, best['file'], best['wall_time'],
+                                                              best['peak_rss_kb']))
+            results.append(best)
+
+    return {
+        'version': BENCHMARK_VERSION,
+        'commit': _git_commit(root_path),
+        'python': platform.python_version(),
+        'giscanner': _giscanner_version(),
+        'repeat': repeat,
+        'results': results,
+        'totals': _totals(results),
+    }
+
+def _giscanner_version():
+    import giscanner
+    return giscanner.__version__
+
+def compare_benchmarks(baseline, current):
+    if baseline.get('version') != current.get('version'):
+        raise ValueError('results version %s cannot be compared with version %s' %
+                         (baseline.get('version'), current.get('version')))
+    lines = []
+    lines.append('%-12s %-36s %10s %10s %8s' % ('mode', 'file', 'before', 'after', 'ratio'))
+    before = dict(((r['mode'], r['file']), r) for r in baseline['results'])
+    for result in current['results']:
+        old = before.get((result['mode'], result['file']))
+        if old is None or result['wall_time'] <= 0:
+            continue
+        lines.append('%-12s %-36s %9.3fs %9.3fs %7.2fx' % (result['mode'], result['file'], old['wall_time'],
+                                                          result['wall_time'], old['wall_time'] / result['wall_time']))
+    for mode, total in sorted(current['totals'].items()):
+        old = baseline['totals'].get(mode)
+        if old is None or total['wall_time'] <= 0:
+            continue
+        lines.append('%-12s %-36s %9.3fs %9.3fs %7.2fx' % (mode, '(total)', old['wall_time'],
+                                                          total['wall_time'], old['wall_time'] / total['wall_time']))
+    return '\n'.join(lines) + '\n'
+
+def _get_option_parser():
+    parser = optparse.OptionParser('%prog [options]')
+    parser.add_option("", "--output",
+                      action="store", dest="output_path", default=None,
+                      help="file to write the JSON results to (default: stdout)")
+    parser.add_option("", "--modes",
+                      action="store", dest="modes", default=','.join(ALL_MODES),
+                      help="comma separated modes to run: %s" % (', '.join(ALL_MODES), ))
+    parser.add_option("", "--repeat",
+                      action="store", type="int", dest="repeat", default=1,
+                      help="number of runs per file; the fastest run is reported")
+    parser.add_option("", "--excluderegistered",
+                      action="store", dest="excluderegistered", default=None,
+                      help="file containing types to be excluded from registered types (check mode)")
+    parser.add_option("", "--compare",
+                      action="store", dest="compare", default=None,
+                      help="earlier JSON results to compare against")
+    return parser
+
+def benchmark_main(args):
+    parser = _get_option_parser()
+    (options, args) = parser.parse_args(args)
+
+    root_path = os.path.dirname(os.path.abspath(__file__))
+    modes = [mode.strip() for mode in options.modes.split(',') if mode.strip()]
+    for mode in modes:
+        if mode not in ALL_MODES:
+            raise SystemExit('ERROR: unknown mode %s' % (mode, ))
+    if options.repeat < 1:
+        raise SystemExit('ERROR: --repeat must be a positive number')
+
+    if options.excluderegistered:
+        excluderegistered = options.excluderegistered
+    else:
+        excluderegistered = os.path.join(root_path, 'config', 'exclude-registered.txt')
+    import gircheck
+    exclude_registered = gircheck.extract_excluderegisteredset(optparse.Values({'excluderegistered': excluderegistered}))
+
+    baseline = None
+    if options.compare:
+        with open(options.compare, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('version') != BENCHMARK_VERSION:
+            raise SystemExit('ERROR: %s has results version %s, expected %s' %
+                             (options.compare, baseline.get('version'), BENCHMARK_VERSION))
+
+    current = run_benchmark(root_path, modes, exclude_registered, options.repeat)
+
+    data = json.dumps(current, indent=2, sort_keys=True) + '\n'
+    if options.output_path:
+        with open(options.output_path, 'w') as o:
+            o.write(data)
+    else:
+        sys.stdout.write(data)
+
+    if baseline is not None:
+        sys.stderr.write(compare_benchmarks(baseline, current))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(benchmark_main(sys.argv))
@@ -163,3 +163,17 @@ Boston, MA 02111-1307, USA.
             yield
         finally:
             self.pop_scope()
+
+class LineBuffer(object):
+    """Collects lines written with the CodeWriter line API so they can be
+    built in a worker process and appended to a CodeWriter later."""
+
+    def __init__(self):
+        self.lines = []
+
+    def write_line(self, line='', indent=True, do_escape=False):
+        self.lines.append((line, indent, do_escape))
+
+    def write_to(self, writer):
+        for line, indent, do_escape in self.lines:
+            writer.write_line(line, indent, do_escape)
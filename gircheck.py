@@ -21,6 +21,9 @@
 #
 
 import errno
+import hashlib
+import io
+import multiprocessing
 import optparse
 import os
 import shutil
@@ -29,34 +32,55 @@ import sys
 import tempfile
 import platform
 import shlex
-
-import gi
-gi.require_version("Gtk", "3.0")
-import gi.overrides
-import gi.types
-
-from gi.repository import Gtk
-from gi.repository import Gio
-from gi.repository import GObject
-from gi.repository import GLib
+import subprocess
+import traceback
 
 import giscanner
 from giscanner import ast
 from giscanner.girparser import GIRParser
 from giscanner.girwriter import GIRWriter as PassthroughWriter
 from girwriter import GIRWriter
+from girwriter import collect_symbols
+from girreader import StreamingGIRParser
 from codewriter import CodeWriter
 from codewriter import COMMENT_HASH
+from codewriter import LineBuffer
+from parsecache import ParseCache
+from parsecache import file_digest
+from probecache import ProbeCache
+from probecache import build_probe
+from probecache import probe_digest
+from probecache import write_if_changed
+from manifest import BuildManifest
+from symbolindex import SymbolIndex
+from symbolindex import SymbolIndexFile
+from identifiers import load_identifier_rules
+from profiling import PhaseProfiler
+from writerstats import WriterStats
+from memorytrace import MemoryTracker
+from memorytrace import MEMORY_PER_INPUT_BYTE
+from memorytrace import save_memory_report
+from memorytrace import set_memory_limit
 
 ALL_EXTS = ['.gir']
 
-class RegisteredType(ast.Type, ast.Registered):
+# Sources whose changes can change the rewritten GIR files
+TOOL_SOURCES = ['gircheck.py', 'girwriter.py', 'girreader.py', 'symbolindex.py', 'identifiers.py',
+                'config/identifier-rules.txt']
+
+class RegisteredType(object):
+    """A registered type: one of the GLib types below or a row of a
+    merged typeinfo.txt, which can hold tens of thousands of them."""
+
+    __slots__ = ('gtype_name', 'get_type', 'ctype', 'fundamental_type')
+
     def __init__(self,
                  gtype_name=None,
                  get_type=None,
                  ctype=None,
                  fundamental_type=None):
-        ast.Registered.__init__(self, gtype_name=gtype_name, get_type=get_type)
+        self.gtype_name = gtype_name
+        self.get_type = get_type
         self.ctype = ctype
         self.fundamental_type = fundamental_type
 
@@ -296,14 +320,115 @@ for typeval in REGISTERED_TYPES:
     registered_type_names[typeval.gtype_name] = typeval
     registered_ctype_names[typeval.ctype] = typeval
 
+class GIRCheckContext(object):
+    def __init__(self, output_path, passthrough=False, exclude_registered=None, parse_cache=None, stream=False, ctype_table=None,
+                 identifier_converter=None, profile_path=None, collect_stats=False, trace_memory=False,
+                 max_memory=None):
+        self.output_path = output_path
+        self.passthrough = passthrough
+        self.parse_cache = parse_cache
+        self.stream = stream
+        # CtypeTable of every file in the run, see build_ctype_table()
+        self.ctype_table = ctype_table
+        self.identifier_converter = identifier_converter
+        self.profile_path = profile_path
+        self.collect_stats = collect_stats
+        self.trace_memory = trace_memory
+        # Memory budget per process in bytes
+        self.max_memory = max_memory
+        if exclude_registered is None:
+            self.exclude_registered = set()
+        else:
+            self.exclude_registered = exclude_registered
+
+    def options_digest(self):
+        digest = hashlib.sha256()
+        digest.update(giscanner.__version__.encode('utf-8'))
+        if self.passthrough == True:
+            digest.update(b'passthrough\n')
+        else:
+            digest.update(b'check\n')
+            if self.stream == True:
+                digest.update(b'stream\n')
+            if self.ctype_table is not None:
+                digest.update(self.ctype_table.digest().encode('utf-8'))
+            if self.identifier_converter is not None:
+                digest.update(repr((sorted(self.identifier_converter.prefix_aliases.items()),
+                                    self.identifier_converter.rules)).encode('utf-8'))
+            for elem in sorted(self.exclude_registered):
+                digest.update(elem.encode('utf-8') + b'\n')
+        tool_path = os.path.dirname(os.path.abspath(__file__))
+        for filename in TOOL_SOURCES:
+            digest.update(file_digest(os.path.join(tool_path, filename)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def output_filename(self, f):
+        path, filename = os.path.split(f)
+        return os.path.join(self.output_path, filename)
+
 class CmakeCodeContext(object):
     def __init__(self):
         self._pkg_index = 0
+        self._packages = set()
 
     def next_pkg_index(self):
         self._pkg_index += 1
         return self._pkg_index
 
+    def packages(self):
+        return sorted(self._packages)
+
+    def write_pkg_check_modules(self, cmake_writer, packages):
+        # Packages exported by several namespaces (glib-2.0, gobject-2.0, ...)
+        # are only checked the first time; the new ones are checked together
+        packages = [pkg for pkg in packages if pkg not in self._packages]
+        if len(packages) == 0:
+            return
+        self._packages.update(packages)
+        i = self.next_pkg_index()
+        cmake_writer.write_line("""pkg_check_modules (PKG%s REQUIRED %s)""" % (str(i), ' '.join(packages),))
+        cmake_writer.write_line("""list(APPEND PROJECT_INCLUDE_DIRECTORIES ${PKG%s_INCLUDE_DIRS})""" % (str(i),))
+        cmake_writer.write_line("""list(APPEND PROJECT_LINK_DIRECTORIES ${PKG%s_LIBRARY_DIRS})""" % (str(i),))
+        cmake_writer.write_line("""set(CMAKE_C_FLAGS "${CMAKE_C_FLAGS} ${PKG%s_CFLAGS}")""" % (str(i),))
+        cmake_writer.write_line("""list(APPEND PROJECT_LIBRARIES ${PKG%s_LIBRARIES})""" % (str(i),))
+        cmake_writer.write_newline()
+
+    def write_remove_duplicates(self, cmake_writer):
+        # Dependencies of different packages share most of their directories
+        for variable in ('PROJECT_INCLUDE_DIRECTORIES', 'PROJECT_LINK_DIRECTORIES'):
+            cmake_writer.write_line("""if (%s)
+  list(REMOVE_DUPLICATES %s)
+endif ()""" % (variable, variable,))
+
+    def write_unity_build(self, cmake_writer, target):
+        # Needs CMake 3.16; older versions build every source separately
+        cmake_writer.write_line("""if (CMAKE_VERSION VERSION_GREATER_EQUAL 3.16)
+  set_target_properties (%s PROPERTIES UNITY_BUILD ON)
+  target_precompile_headers (%s PRIVATE ${CMAKE_CURRENT_SOURCE_DIR}/girtypes.h)
+endif ()""" % (target, target,))
+
+class TypeinfoContext(object):
+    def __init__(self, infoformat, exclude_gtypes=None, exclude_headers=None, parse_cache=None):
+        self.infoformat = infoformat
+        self.exclude_gtypes = exclude_gtypes if exclude_gtypes is not None else set()
+        self.exclude_headers = exclude_headers if exclude_headers is not None else set()
+        self.parse_cache = parse_cache
+
+class TypeinfoFragment(object):
+    """Everything generated for one GIR file, built in a worker and
+    assembled into the CMake, header and main sources in input order."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.namespace_name = None
+        # Names of the namespaces included by the GIR file
+        self.includes = []
+        self.packages = []
+        # [(output filename, utf-8 encoded source)]
+        self.sources = []
+        self.header_writer = LineBuffer()
+        self.main_writer = LineBuffer()
+
 def _get_option_parser():
     parser = optparse.OptionParser('%prog [options]',
                                    version='%prog ' + giscanner.__version__)
@@ -322,6 +447,15 @@ def _get_option_parser():
     parser.add_option('', "--signalinfo",
                     action="store_true", dest="signalinfo", default=False,
                     help="If true, parse and write GIR file signal information program")
+    parser.add_option('', "--allinfo",
+                    action="store_true", dest="allinfo", default=False,
+                    help="If true, parse and write one GIR file type, property and signal information program")
+    parser.add_option('', "--buildprobe",
+                    action="store_true", dest="buildprobe", default=False,
+                    help="If true, build the information program with CMake in <output>/build, reusing the one in --cache when the generated sources are unchanged")
+    parser.add_option('', "--unitybuild",
+                    action="store_true", dest="unitybuild", default=False,
+                    help="If true, build the information program as a unity build with a precompiled header")
     parser.add_option("", "--filelist",
                       action="store", dest="filelist", default=[],
                       help="file containing GIR files to be checked")
@@ -337,13 +471,131 @@ def _get_option_parser():
     parser.add_option("", "--excluderegistered",
                       action="store", dest="excluderegistered", default=[],
                       help="file containing types to be excluded from registered types")
+    parser.add_option("", "--jobs",
+                      action="store", type="int", dest="jobs", default=1,
+                      help="number of GIR files to check in parallel (0 uses all CPUs)")
+    parser.add_option("", "--cache",
+                      action="store", dest="cache_path", default=None,
+                      help="directory used to cache parsed GIR files between runs")
+    parser.add_option("", "--stream",
+                      action="store_true", dest="stream", default=False,
+                      help="If true, read and write GIR files incrementally to bound memory use")
+    parser.add_option("", "--sharesymbols",
+                      action="store_true", dest="sharesymbols", default=False,
+                      help="If true, resolve missing C types from the symbols of all GIR files in the run")
+    parser.add_option("", "--symbolindex",
+                      action="store", dest="symbolindex", default=None,
+                      help="file used to keep the shared symbol index between runs (implies --sharesymbols)")
+    parser.add_option("", "--identifierrules",
+                      action="store", dest="identifierrules", default=None,
+                      help="file containing the rules used to derive get_type function names")
+    parser.add_option("", "--force",
+                      action="store_true", dest="force", default=False,
+                      help="If true, rewrite all GIR files even if they are up to date")
+    parser.add_option("", "--profile",
+                      action="store", dest="profile_path", default=None,
+                      help="directory to write per file cProfile dumps and summaries to")
+    parser.add_option("", "--stats",
+                      action="store", dest="stats", default=None,
+                      help="file to write per namespace and per node kind writer statistics to (JSON)")
+    parser.add_option("", "--tracememory",
+                      action="store", dest="tracememory", default=None,
+                      help="file to write the peak memory of each phase per GIR file to (JSON)")
+    parser.add_option("", "--maxmemory",
+                      action="store", type="int", dest="maxmemory", default=None,
+                      help="memory limit per process in MB; larger GIR files are streamed")
     return parser
 
 
 def _error(msg):
     raise SystemExit('ERROR: %s' % (msg, ))
 
-def _write_type_names(writer, exclude_gtypes, namespace_name, type_names, infoformat="typeinfo", unregistered=False):
+# Probe record streams, see print_type_infos() in girtypes.c
+INFO_FORMATS = {
+    "typeinfo": "GIR_TYPEINFO",
+    "propertyinfo": "GIR_PROPERTYINFO",
+    "signalinfo": "GIR_SIGNALINFO",
+    "allinfo": "GIR_ALLINFO",
+}
+
+# Namespaces whose types can only be probed after gtk_init()
+GTK_NAMESPACES = ('Gtk', 'Gdk')
+
+def _has_typeinfo(infoformat):
+    return infoformat in ("typeinfo", "allinfo")
+
+# Fundamental types named by g_type_fundamental_tostring() in girtypes.c.
+# Derived types (G_TYPE_PARAM_*, G_TYPE_GTYPE, G_TYPE_CHECKSUM) are not
+# listed since g_type_fundamental() never returns them.
+FUNDAMENTAL_TYPE_NAMES = [
+    'G_TYPE_INVALID',
+    'G_TYPE_NONE',
+    'G_TYPE_INTERFACE',
+    'G_TYPE_CHAR',
+    'G_TYPE_UCHAR',
+    'G_TYPE_BOOLEAN',
+    'G_TYPE_INT',
+    'G_TYPE_UINT',
+    'G_TYPE_LONG',
+    'G_TYPE_ULONG',
+    'G_TYPE_INT64',
+    'G_TYPE_UINT64',
+    'G_TYPE_ENUM',
+    'G_TYPE_FLAGS',
+    'G_TYPE_FLOAT',
+    'G_TYPE_DOUBLE',
+    'G_TYPE_STRING',
+    'G_TYPE_POINTER',
+    'G_TYPE_BOXED',
+    'G_TYPE_PARAM',
+    'G_TYPE_OBJECT',
+    'G_TYPE_VARIANT',
+]
+
+def _fundamental_tostring_source(type_names=FUNDAMENTAL_TYPE_NAMES):
+    # Fundamental types are small integers, so names are looked up in a
+    # table indexed by gtype >> G_TYPE_FUNDAMENTAL_SHIFT that is filled once
+    lines = []
+    lines.append("""static const char *fundamental_type_names[(G_TYPE_FUNDAMENTAL_MAX >> G_TYPE_FUNDAMENTAL_SHIFT) + 1];""")
+    lines.append("")
+    lines.append("""static void init_fundamental_type_names() {""")
+    for name in sorted(set(type_names), key=type_names.index):
+        lines.append("""  fundamental_type_names[%s >> G_TYPE_FUNDAMENTAL_SHIFT] = "%s";""" % (name, name,))
+    lines.append("""}""")
+    lines.append("")
+    lines.append("""const char * g_type_fundamental_tostring(GType gtype) {
+  static gboolean initialized = FALSE;
+  GType _gtype = g_type_fundamental(gtype);
+  const char *name = NULL;
+
+  if (!initialized) {
+    init_fundamental_type_names();
+    initialized = TRUE;
+  }
+
+  if (_gtype <= G_TYPE_FUNDAMENTAL_MAX)
+    name = fundamental_type_names[_gtype >> G_TYPE_FUNDAMENTAL_SHIFT];
+  if (name == NULL)
+    return "UNKNOWN";
+  return name;
+}""")
+    return "\n".join(lines)
+
+def _c_string(value):
+    return '"%s"' % (('%s' % (value,)).replace('\\', '\\\\').replace('"', '\\"'),)
+
+def _write_type_names(writer, namespace_name, type_names, function_name, infoformat="typeinfo", unregistered=False,
+                      exclude_gtypes=None):
+    # Emits a static table of type descriptors and a function that walks it
+    # with print_type_infos(), instead of one print statement per type.
+    # Excluded gtypes are skipped by the probe at runtime, see
+    # load_exclude_gtypes() in girtypes.c; the get_type functions of the
+    # gtypes in exclude_gtypes are not linked in but looked up by name
+    if exclude_gtypes is None:
+        exclude_gtypes = set()
+    rows = []
+    get_type_functions = set()
+    get_type_macros = set()
     fundamental_gtype = 'G_TYPE_INVALID'
     for key, node in type_names.items():
         node_type = "unknown"
@@ -383,13 +635,16 @@ def _write_type_names(writer, exclude_gtypes, namespace_name, type_names, infofo
         elif isinstance(node, ast.Constant):
             node_type = "constant"
             fundamental_gtype = 'G_TYPE_INVALID' # C define can be any number of types
-        elif isinstance(node, ast.Type):
+        elif isinstance(node, (ast.Type, RegisteredType)):
             node_type = "type"
         elif isinstance(node, ast.Registered):
             node_type = "registered"
 
         gtype_name = None
         get_type   = None
+        # A get_type function, or the name passed to g_type_from_name()
+        get_type_function = None
+        type_from_name = None
 
         if hasattr(node, 'gtype_name') and node.gtype_name is not None:
             gtype_name = node.gtype_name
@@ -407,55 +662,77 @@ def _write_type_names(writer, exclude_gtypes, namespace_name, type_names, infofo
                     get_type = type_node.get_type
                 else:
                     get_type = node.gtype_name + "not found"
-            else:
-                if not get_type.startswith("G_TYPE_"):
-                    get_type += '()'
+                    type_from_name = node.gtype_name
+            elif not get_type.startswith("G_TYPE_"):
+                get_type_function = get_type
+                get_type += '()'
         elif unregistered == False:
             get_type = 'g_type_from_name("%s")' % node.target_fundamental
+            type_from_name = node.target_fundamental
         else:
             get_type = fundamental_gtype
 
+        get_type_symbol = None
+        if get_type_function is not None:
+            if gtype_name in exclude_gtypes:
+                # Its library may not exist on this platform
+                get_type_symbol = get_type_function
+                get_type_function = None
+            else:
+                get_type_functions.add(get_type_function)
+        elif type_from_name is None:
+            # G_TYPE_* macros are not all constant expressions, so they
+            # are wrapped in a function
+            get_type_function = '%s_%s' % (namespace_name, get_type)
+            get_type_macros.add(get_type)
+
+        ctype = None
+        warning = None
         if hasattr(node, 'ctype') and node.ctype is not None:
             ctype = node.ctype
         elif hasattr(node, 'complete_ctype') and node.complete_ctype is not None:
             ctype = node.complete_ctype
         elif gtype_name is not None:
             # NOTE: ctype is missing from GIR file
-            writer.write_line("""/* WARNING: ctype is missing for '%s' in GIR file */""" % (gtype_name,))
+            warning = """/* WARNING: ctype is missing for '%s' in GIR file */""" % (gtype_name,)
             ctype = gtype_name
 
-        if gtype_name is not None:
-            if gtype_name in exclude_gtypes:
-                writer.write_source("""/*""")
-        if "signalinfo" == infoformat:
-            writer.write_line("""print_object_signals(stdout,%s,"%s","%s","%s");""" % (get_type.replace('"', '\\"'), namespace_name, node_type, gtype_name))
-        elif "propertyinfo" == infoformat:
-            writer.write_line("""print_object_properties(stdout,%s,"%s","%s","%s");""" % (get_type.replace('"', '\\"'), namespace_name, node_type, gtype_name))
-        else:
-            writer.write_source("""printf("%s,%s,%s,%s,%s,%s\\n",""")
-            writer.write_line(""" "%s", "%s", "%s", "%s", "%s", g_type_fundamental_tostring((unsigned long)%s));""" % (namespace_name, node_type, gtype_name, ctype, get_type.replace('"', '\\"'), get_type,), False)
-        if gtype_name is not None:
-            if gtype_name in exclude_gtypes:
-                writer.write_line("""*/""")
-
-def typeinformation_gir(exclude_gtypes, exclude_headers, code_context, path, f, cmake_writer, header_writer, main_writer, infoformat):
+        row = "{ %s, %s, %s, %s, %s, %s, %s, %s }," % (_c_string(namespace_name), _c_string(node_type), _c_string(gtype_name),
+                                                      _c_string(ctype), _c_string(get_type), get_type_function or "NULL",
+                                                      _c_string(get_type_symbol) if get_type_symbol is not None else "NULL",
+                                                      _c_string(type_from_name) if type_from_name is not None else "NULL")
+        rows.append((row, warning))
+
+    infos_name = function_name.replace('print_', '', 1) + '_infos'
+    if len(rows) > 0:
+        for get_type_function in sorted(get_type_functions):
+            # Parenthesized so a function-like macro of the same name is not expanded
+            writer.write_line("""GType (%s) (void);""" % (get_type_function,))
+        for macro in sorted(get_type_macros):
+            writer.write_line("""static GType %s_%s (void) { return %s; }""" % (namespace_name, macro, macro,))
+        writer.write_newline()
+        writer.write_line("""static const GirTypeInfo %s[] = {""" % (infos_name,))
+        for row, warning in rows:
+            if warning is not None:
+                writer.write_line("  " + warning)
+            writer.write_line("  " + row)
+        writer.write_line("""};""")
+        writer.write_newline()
+
+    writer.write_line("""void %s()""" % (function_name,))
+    with writer.scopecontext('function', []):
+        if len(rows) > 0:
+            writer.write_line("""print_type_infos(%s, G_N_ELEMENTS(%s), %s);""" % (infos_name, infos_name, INFO_FORMATS[infoformat]))
+def parse_gir(path, parse_cache=None):
+    if parse_cache is not None:
+        return parse_cache.get_namespace(path)
     parser = GIRParser()
     parser.parse(path)
+    return parser.get_namespace()
 
-    namespace = parser.get_namespace()
-
+def typeinformation_gir(exclude_gtypes, exclude_headers, namespace, f, header_writer, main_writer, infoformat):
     writer = CodeWriter()
 
-    i = 0
-    for pkg in sorted(set(namespace.exported_packages)):
-        i = code_context.next_pkg_index()
-        cmake_writer.write_line("""pkg_check_modules (PKG%s REQUIRED %s)""" % (str(i), pkg,))
-        cmake_writer.write_line("""list(APPEND PROJECT_INCLUDE_DIRECTORIES ${PKG%s_INCLUDE_DIRS})""" % (str(i),))
-        cmake_writer.write_line("""list(APPEND PROJECT_LINK_DIRECTORIES ${PKG%s_LIBRARY_DIRS})""" % (str(i),))
-        cmake_writer.write_line("""set(CMAKE_C_FLAGS "${CMAKE_C_FLAGS} ${PKG%s_CFLAGS}")""" % (str(i),))
-        cmake_writer.write_line("""list(APPEND PROJECT_LIBRARIES ${PKG%s_LIBRARIES})""" % (str(i),))
-        cmake_writer.write_newline()
-    
     writer.write_newline()
     writer.write_line('''#include "girtypes.h"
 #include <glib-2.0/glib-object.h>''')
@@ -467,25 +744,15 @@ def typeinformation_gir(exclude_gtypes, exclude_headers, code_context, path, f,
     writer.write_newline()
 
     namespace_name = namespace.name
-    attrs = []
 
-    writer.write_line("""void print_%s_types()""" % (namespace_name,))
     header_writer.write_line("""void print_%s_types();""" % (namespace_name,))
-    main_writer.write_line("""    fprintf(stderr, "processing %s types....\\n");""" % (namespace_name,))
-    main_writer.write_line("""    print_%s_types();""" % (namespace_name,))
-    with writer.scopecontext('function', attrs):
-        _write_type_names(writer, exclude_gtypes, namespace_name, namespace.type_names, infoformat)
+    main_writer.write_line("""  { "%s", "types", print_%s_types },""" % (namespace_name, namespace_name,))
+    _write_type_names(writer, namespace_name, namespace.type_names, "print_%s_types" % (namespace_name,), infoformat,
+                      exclude_gtypes=exclude_gtypes)
 
     f.write(writer.get_encoded_source())
 
-    return code_context
-
-def typeinformation_ctypes(exclude_gtypes, exclude_headers, code_context, path, f, cmake_writer, header_writer, main_writer, infoformat):
-    parser = GIRParser()
-    parser.parse(path)
-
-    namespace = parser.get_namespace()
-
+def typeinformation_ctypes(exclude_gtypes, exclude_headers, namespace, f, header_writer, main_writer, infoformat):
     # C types that are not registered types
 
     unregistered_ctypes = {}
@@ -505,22 +772,19 @@ def typeinformation_ctypes(exclude_gtypes, exclude_headers, code_context, path,
     writer.write_newline()
 
     namespace_name = namespace.name
-    attrs = []
 
-    writer.write_line("""void print_%s_ctypes_types()""" % (namespace_name,))
-    header_writer.write_line("""void print_%s_types();""" % (namespace_name,))
-    main_writer.write_line("""    fprintf(stderr, "processing %s ctypes types....\\n");""" % (namespace_name,))
-    main_writer.write_line("""    print_%s_ctypes_types();""" % (namespace_name,))
-    with writer.scopecontext('function', attrs):
-        if "typeinfo" == infoformat:
-            _write_type_names(writer, exclude_gtypes, namespace_name, unregistered_ctypes, infoformat, True)
+    header_writer.write_line("""void print_%s_ctypes_types();""" % (namespace_name,))
+    main_writer.write_line("""  { "%s", "ctypes types", print_%s_ctypes_types },""" % (namespace_name, namespace_name,))
+    if _has_typeinfo(infoformat) == False:
+        unregistered_ctypes = {}
+    # Unregistered C types only have type records
+    _write_type_names(writer, namespace_name, unregistered_ctypes, "print_%s_ctypes_types" % (namespace_name,), "typeinfo", True,
+                      exclude_gtypes=exclude_gtypes)
 
     f.write(writer.get_encoded_source())
 
-    return code_context
 
-
-def typeinformation_registered(exclude_gtypes, exclude_headers, code_context, path, f, cmake_writer, header_writer, main_writer, infoformat):
+def typeinformation_registered(exclude_gtypes, exclude_headers, f, header_writer, main_writer, infoformat):
     writer = CodeWriter()
     
     writer.write_newline()
@@ -529,33 +793,263 @@ def typeinformation_registered(exclude_gtypes, exclude_headers, code_context, pa
     writer.write_newline()
 
     namespace_name = "registered"
-    attrs = []
 
-    writer.write_line("""void print_%s_types()""" % (namespace_name,))
     header_writer.write_line("""void print_%s_types();""" % (namespace_name,))
-    main_writer.write_line("""    fprintf(stderr, "processing %s types....\\n");""" % (namespace_name,))
-    main_writer.write_line("""    print_%s_types();""" % (namespace_name,))
-    with writer.scopecontext('function', attrs):
-        if "typeinfo" == infoformat:
-            _write_type_names(writer, exclude_gtypes, namespace_name, registered_type_names, infoformat)
+    main_writer.write_line("""  { "%s", "types", print_%s_types },""" % (namespace_name, namespace_name,))
+    if _has_typeinfo(infoformat) == True:
+        type_names = registered_type_names
+    else:
+        type_names = {}
+    _write_type_names(writer, namespace_name, type_names, "print_%s_types" % (namespace_name,), "typeinfo",
+                      exclude_gtypes=exclude_gtypes)
 
     f.write(writer.get_encoded_source())
 
-    return code_context
-
-def passthrough_gir(path, f):
-    parser = GIRParser()
-    parser.parse(path)
-
-    writer = PassthroughWriter(parser.get_namespace())
+def _generate_typeinfo(task):
+    # Runs in a worker process when --jobs is used
+    context, f = task
+    fragment = TypeinfoFragment(f)
+    # Both sources for a GIR file are generated from one parse
+    namespace = parse_gir(f, context.parse_cache)
+    fragment.namespace_name = namespace.name
+    fragment.includes = sorted(set(include.name for include in namespace.includes))
+    fragment.packages = sorted(set(namespace.exported_packages))
+
+    filename = os.path.splitext(os.path.basename(f))[0]
+    o = io.BytesIO()
+    typeinformation_gir(context.exclude_gtypes, context.exclude_headers, namespace, o,
+                        fragment.header_writer, fragment.main_writer, context.infoformat)
+    fragment.sources.append((filename + '.c', o.getvalue()))
+    if _has_typeinfo(context.infoformat) == True:
+        # Write unregistered ctypes
+        o = io.BytesIO()
+        typeinformation_ctypes(context.exclude_gtypes, context.exclude_headers, namespace, o,
+                               fragment.header_writer, fragment.main_writer, context.infoformat)
+        fragment.sources.append((filename + '_ctypes.c', o.getvalue()))
+    return fragment
+
+def gtk_namespaces(namespace_includes):
+    # Namespaces that include Gtk or Gdk, directly or through another
+    # namespace in namespace_includes ({namespace name: included names})
+    needs_gtk = set(name for name in namespace_includes if name in GTK_NAMESPACES)
+    changed = True
+    while changed == True:
+        changed = False
+        for name, includes in namespace_includes.items():
+            if name in needs_gtk:
+                continue
+            if any(include in GTK_NAMESPACES or include in needs_gtk for include in includes):
+                needs_gtk.add(name)
+                changed = True
+    return needs_gtk
+
+def generate_typeinfo(context, filenames, output_path, cmake_writer, code_context, header_writer, main_writer, jobs=1):
+    # Returns the namespaces whose probe tasks need GTK initialized and the
+    # names of the sources written to output_path
+    tasks = [(context, f) for f in filenames]
+    namespace_includes = {}
+    source_filenames = []
+    for fragment in _map_tasks(_generate_typeinfo, tasks, jobs):
+        namespace_includes[fragment.namespace_name] = fragment.includes
+        for i, (filename, source) in enumerate(fragment.sources):
+            cmake_writer.write_line("""set(PROJECT_SOURCES ${PROJECT_SOURCES} ${CMAKE_CURRENT_SOURCE_DIR}/%s)""" % (filename,))
+            if i == 0:
+                code_context.write_pkg_check_modules(cmake_writer, fragment.packages)
+            write_if_changed(os.path.join(output_path, filename), source)
+            source_filenames.append(filename)
+        fragment.header_writer.write_to(header_writer)
+        fragment.main_writer.write_to(main_writer)
+    return gtk_namespaces(namespace_includes), source_filenames
+
+def passthrough_gir(path, f, parse_cache=None):
+    writer = PassthroughWriter(parse_gir(path, parse_cache))
     f.write(writer.get_encoded_xml())
 
-def process_gir(path, f, exclude_registered):
-    parser = GIRParser()
-    parser.parse(path)
-
-    writer = GIRWriter(parser.get_namespace(), exclude_registered=exclude_registered)
-    f.write(writer.get_encoded_xml())
+def process_gir(path, f, exclude_registered, parse_cache=None, stream=False, ctype_table=None,
+                identifier_converter=None, stats=None):
+    if stream == True:
+        # Nodes are written in file order as they are parsed and then dropped,
+        # so C types are collected in a separate streaming pass first unless
+        # the run's table already has them
+        stream_index = None
+        if ctype_table is None:
+            parser = StreamingGIRParser()
+            namespace = parser.open(path)
+            stream_index = collect_symbols(namespace, nodes=parser.nodes())
+
+        parser = StreamingGIRParser()
+        namespace = parser.open(path)
+        GIRWriter(namespace, exclude_registered=exclude_registered, output=f, nodes=parser.nodes(),
+                  symbol_index=stream_index, ctype_table=ctype_table,
+                  identifier_converter=identifier_converter, stats=stats)
+        return
+
+    GIRWriter(parse_gir(path, parse_cache), exclude_registered=exclude_registered, output=f,
+              ctype_table=ctype_table, identifier_converter=identifier_converter, stats=stats)
+
+def _process_gir_phases(context, path, f, phase, stats=None):
+    # The document is buffered rather than streamed so that writing and
+    # serializing it are measured as separate phases
+    with phase('parse'):
+        namespace = parse_gir(path, context.parse_cache)
+    with phase('write'):
+        if context.passthrough == True:
+            writer = PassthroughWriter(namespace)
+        else:
+            writer = GIRWriter(namespace, exclude_registered=context.exclude_registered,
+                               ctype_table=context.ctype_table,
+                               identifier_converter=context.identifier_converter, stats=stats)
+    with phase('serialize'):
+        f.write(writer.get_encoded_xml())
+
+def profile_gir(context, path, f, stats=None):
+    name = os.path.splitext(os.path.basename(path))[0]
+    profiler = PhaseProfiler(context.profile_path, name)
+    _process_gir_phases(context, path, f, profiler.phase, stats)
+    profiler.write_summary()
+
+def trace_gir(context, path, f, stats=None):
+    tracker = MemoryTracker()
+    _process_gir_phases(context, path, f, tracker.phase, stats)
+    return tracker.phases
+
+class CheckResult(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.error = None
+        self.stats = None
+        self.memory = None
+        self.notes = []
+
+def _write_gir_file(context, f, o, result, stream):
+    if context.profile_path is not None:
+        profile_gir(context, f, o, stats=result.stats)
+    elif context.trace_memory == True:
+        result.memory = trace_gir(context, f, o, stats=result.stats)
+    elif context.passthrough == True:
+        passthrough_gir(f, o, parse_cache=context.parse_cache)
+    else:
+        process_gir(f, o, context.exclude_registered, parse_cache=context.parse_cache, stream=stream,
+                    ctype_table=context.ctype_table,
+                    identifier_converter=context.identifier_converter, stats=result.stats)
+
+def _check_gir_file(task):
+    # Runs in a worker process when --jobs is used; errors are returned
+    # rather than raised so they can be reported in input order.
+    context, f = task
+    outputFilename = context.output_filename(f)
+    result = CheckResult(f)
+    if context.collect_stats == True:
+        result.stats = WriterStats()
+
+    # Only plain checks can switch to the streaming path
+    can_stream = (context.stream == False and context.passthrough == False and
+                  context.profile_path is None and context.trace_memory == False)
+    stream = context.stream
+    if can_stream == True and context.max_memory is not None:
+        estimate = os.path.getsize(f) * MEMORY_PER_INPUT_BYTE
+        if estimate > context.max_memory:
+            result.notes.append('estimated %d MB exceeds --maxmemory, streaming instead' % (estimate // (1024 * 1024), ))
+            stream = True
+    try:
+        with open(outputFilename, 'wb') as o:
+            try:
+                _write_gir_file(context, f, o, result, stream)
+            except MemoryError:
+                if can_stream == False or stream == True:
+                    raise
+                result.notes.append('ran out of memory, streaming instead')
+                o.seek(0)
+                o.truncate()
+                if result.stats is not None:
+                    result.stats = WriterStats()
+                stream = True
+                _write_gir_file(context, f, o, result, stream)
+            o.flush()
+    except MemoryError:
+        if context.max_memory is not None:
+            result.error = 'ran out of memory (--maxmemory=%d MB)\n' % (context.max_memory // (1024 * 1024), )
+        else:
+            result.error = 'ran out of memory\n'
+        result.stats = None
+    except Exception:
+        result.error = traceback.format_exc()
+        result.stats = None
+    return result
+
+def _map_tasks(func, tasks, jobs=1):
+    if jobs == 0:
+        jobs = multiprocessing.cpu_count()
+    if jobs > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(processes=min(jobs, len(tasks))) as pool:
+            # imap preserves input order so results are reported deterministically
+            return list(pool.imap(func, tasks))
+    return [func(task) for task in tasks]
+
+def _collect_gir_symbols(task):
+    context, f = task
+    return collect_symbols(parse_gir(f, context.parse_cache))
+
+def build_ctype_table(context, filenames, jobs=1, index_file=None):
+    # Pre-pass over every file so C types learned in one namespace
+    # (e.g. GLib) can be used when writing the others. The writers only
+    # read the returned table; where files disagree on a C type the first
+    # file in the list wins
+    indexes = {}
+    digests = {}
+    pending = []
+    for f in filenames:
+        if index_file is not None:
+            digests[f] = file_digest(f)
+            index = index_file.get(f, digests[f])
+            if index is not None:
+                indexes[f] = index
+                continue
+        pending.append(f)
+
+    tasks = [(context, f) for f in pending]
+    for f, index in zip(pending, _map_tasks(_collect_gir_symbols, tasks, jobs)):
+        indexes[f] = index
+        if index_file is not None:
+            index_file.put(f, digests[f], index)
+
+    symbol_index = SymbolIndex()
+    for f in filenames:
+        symbol_index.update(indexes[f])
+    return symbol_index.finalize()
+
+def check_gir_files(context, filenames, jobs=1, manifest=None, stats=None, memory_report=None):
+    if manifest is not None:
+        options_digest = context.options_digest()
+        input_digests = {}
+        stale = []
+        for f in filenames:
+            input_digests[f] = file_digest(f)
+            if not manifest.is_current(context.output_filename(f), input_digests[f], options_digest):
+                stale.append(f)
+        filenames = stale
+
+    tasks = [(context, f) for f in filenames]
+    results = _map_tasks(_check_gir_file, tasks, jobs)
+
+    failed = 0
+    for result in results:
+        f = result.filename
+        for note in result.notes:
+            sys.stderr.write('WARNING: %s: %s\n' % (f, note))
+        if result.error is not None:
+            failed += 1
+            sys.stderr.write('ERROR: %s\n%s\n' % (f, result.error))
+            continue
+        if stats is not None and result.stats is not None:
+            stats.update(result.stats)
+        if memory_report is not None and result.memory is not None:
+            memory_report[os.path.basename(f)] = result.memory
+        if manifest is not None:
+            manifest.update(context.output_filename(f), f, input_digests[f], options_digest)
+    if manifest is not None:
+        manifest.save()
+    return failed
 
 def extract_filenames(args):
     filenames = []
@@ -601,10 +1095,11 @@ def extract_typeinfo(options):
     if not os.path.exists(typeinfo_filename):
         _error('%s: no such type information file' % (typeinfo_filename, ))
     with open(typeinfo_filename, "r") as typeinfo_file:
-        lines = typeinfo_file.readlines()
-    for line in lines:
-        namespace_name, node_type, gtype_name, ctype, get_type, fundamental_type = line.strip().split(",")
-        typeinfo[gtype_name] = RegisteredType(gtype_name=gtype_name, ctype=ctype, get_type=get_type, fundamental_type=fundamental_type)
+        for line in typeinfo_file:
+            namespace_name, node_type, gtype_name, ctype, get_type, fundamental_type = line.strip().split(",")
+            # Only a few dozen distinct fundamental types
+            fundamental_type = sys.intern(fundamental_type)
+            typeinfo[gtype_name] = RegisteredType(gtype_name=gtype_name, ctype=ctype, get_type=get_type, fundamental_type=fundamental_type)
 
     return typeinfo
 
@@ -711,6 +1206,14 @@ def scanner_main(args):
         print("Error: output path '" + outputPath + "' does not exist.")
         sys.exit(1)
 
+    if options.jobs < 0:
+        _error('--jobs must be zero or a positive number')
+
+    if options.cache_path:
+        parse_cache = ParseCache(os.path.abspath(os.path.expanduser(options.cache_path)))
+    else:
+        parse_cache = None
+
     if hasattr(options, 'mergeinfo') and options.mergeinfo:
         typeinfo_filename, propertyinfo_filename = options.mergeinfo.split(",")
         typeinfo = extract_typeinfo(options)
@@ -724,8 +1227,10 @@ def scanner_main(args):
             for line in propinfo:
                 o.write(line)
             o.flush()
-    elif options.typeinfo == True or options.propertyinfo == True or options.signalinfo == True:
-        if options.propertyinfo == True:
+    elif options.typeinfo == True or options.propertyinfo == True or options.signalinfo == True or options.allinfo == True:
+        if options.allinfo == True:
+            infoformat = "allinfo"
+        elif options.propertyinfo == True:
             infoformat = "propertyinfo"
         elif options.signalinfo == True:
             infoformat = "signalinfo"
@@ -734,6 +1239,14 @@ def scanner_main(args):
         else:
             infoformat = ""
         # https://cmake.org/cmake/help/latest/module/FindPkgConfig.html
+        # The probe reads the excluded gtypes when it runs, so the copy can
+        # be edited without regenerating or rebuilding it
+        outputExcludeFilename = os.path.join(outputPath, 'exclude-gtypes.txt')
+        if options.excludegtypes:
+            with open(options.excludegtypes, 'rb') as f:
+                write_if_changed(outputExcludeFilename, f.read())
+        else:
+            write_if_changed(outputExcludeFilename, b'# gtypes not to probe, one per line\n')
         outputCmakeFilename = os.path.join(outputPath, 'CMakeLists.txt')
         cmake_writer = CodeWriter(COMMENT_HASH)
         cmake_code_context = CmakeCodeContext()
@@ -745,6 +1258,8 @@ find_package (PkgConfig REQUIRED)
 set(PROJECT_SOURCES ${PROJECT_SOURCES} girtypes.c)
 
 """)
+        # girtypes.c looks up the get_type functions of excluded gtypes
+        cmake_code_context.write_pkg_check_modules(cmake_writer, ['gmodule-2.0'])
         outputHeaderFilename = os.path.join(outputPath, 'girtypes.h')
         header_writer = CodeWriter()
 
@@ -752,159 +1267,20 @@ set(PROJECT_SOURCES ${PROJECT_SOURCES} girtypes.c)
         main_writer = CodeWriter()
 
         # https://github.com/GNOME/gtk-doc/blob/master/gtkdoc/scangobj.py
-        main_writer.write_line('''#include "girtypes.h"
-
-const char * g_type_fundamental_tostring(GType gtype) {
-  GType _gtype = g_type_fundamental(gtype);
-
-  if (_gtype == G_TYPE_INVALID) {
-    return "G_TYPE_INVALID";
-  }
-  else if (_gtype == G_TYPE_NONE) {
-    return "G_TYPE_NONE";
-  }
-  else if (_gtype == G_TYPE_INTERFACE) {
-    return "G_TYPE_INTERFACE";
-  }
-  else if (_gtype == G_TYPE_CHAR) {
-    return "G_TYPE_CHAR";
-  }
-  else if (_gtype == G_TYPE_UCHAR) {
-    return "G_TYPE_UCHAR";
-  }
-  else if (_gtype == G_TYPE_BOOLEAN) {
-    return "G_TYPE_BOOLEAN";
-  }
-  else if (_gtype == G_TYPE_INT) {
-    return "G_TYPE_INT";
-  }
-  else if (_gtype == G_TYPE_UINT) {
-    return "G_TYPE_UINT";
-  }
-  else if (_gtype == G_TYPE_LONG) {
-    return "G_TYPE_LONG";
-  }
-  else if (_gtype == G_TYPE_ULONG) {
-    return "G_TYPE_ULONG";
-  }
-  else if (_gtype == G_TYPE_INT64) {
-    return "G_TYPE_INT64";
-  }
-  else if (_gtype == G_TYPE_UINT64) {
-    return "G_TYPE_UINT64";
-  }
-  else if (_gtype == G_TYPE_ENUM) {
-    return "G_TYPE_ENUM";
-  }
-  else if (_gtype == G_TYPE_FLAGS) {
-    return "G_TYPE_FLAGS";
-  }
-  else if (_gtype == G_TYPE_FLOAT) {
-    return "G_TYPE_FLOAT";
-  }
-  else if (_gtype == G_TYPE_DOUBLE) {
-    return "G_TYPE_DOUBLE";
-  }
-  else if (_gtype == G_TYPE_STRING) {
-    return "G_TYPE_STRING";
-  }
-  else if (_gtype == G_TYPE_POINTER) {
-    return "G_TYPE_POINTER";
-  }
-  else if (_gtype == G_TYPE_BOXED) {
-    return "G_TYPE_BOXED";
-  }
-  else if (_gtype == G_TYPE_PARAM) {
-    return "G_TYPE_PARAM";
-  }
-  else if (_gtype == G_TYPE_OBJECT) {
-    return "G_TYPE_OBJECT";
-  }
-  else if (_gtype == G_TYPE_GTYPE) {
-    return "G_TYPE_GTYPE";
-  }
-  else if (_gtype == G_TYPE_VARIANT) {
-    return "G_TYPE_VARIANT";
-  }
-  else if (_gtype == G_TYPE_CHECKSUM) {
-    return "G_TYPE_CHECKSUM";
-  }
-  else if (_gtype == G_TYPE_PARAM_BOOLEAN) {
-    return "G_TYPE_PARAM_BOOLEAN";
-  }
-  else if (_gtype == G_TYPE_PARAM_CHAR) {
-    return "G_TYPE_PARAM_CHAR";
-  }
-  else if (_gtype == G_TYPE_PARAM_UCHAR) {
-    return "G_TYPE_PARAM_UCHAR";
-  }
-  else if (_gtype == G_TYPE_PARAM_INT) {
-    return "G_TYPE_PARAM_INT";
-  }
-  else if (_gtype == G_TYPE_PARAM_UINT) {
-    return "G_TYPE_PARAM_UINT";
-  }
-  else if (_gtype == G_TYPE_PARAM_LONG) {
-    return "G_TYPE_PARAM_LONG";
-  }
-  else if (_gtype == G_TYPE_PARAM_ULONG) {
-    return "G_TYPE_PARAM_ULONG";
-  }
-  else if (_gtype == G_TYPE_PARAM_INT64) {
-    return "G_TYPE_PARAM_INT64";
-  }
-  else if (_gtype == G_TYPE_PARAM_UINT64) {
-    return "G_TYPE_PARAM_UINT64";
-  }
-  else if (_gtype == G_TYPE_PARAM_FLOAT) {
-    return "G_TYPE_PARAM_FLOAT";
-  }
-  else if (_gtype == G_TYPE_PARAM_DOUBLE) {
-    return "G_TYPE_PARAM_DOUBLE";
-  }
-  else if (_gtype == G_TYPE_PARAM_ENUM) {
-    return "G_TYPE_PARAM_ENUM";
-  }
-  else if (_gtype == G_TYPE_PARAM_FLAGS) {
-    return "G_TYPE_PARAM_FLAGS";
-  }
-  else if (_gtype == G_TYPE_PARAM_STRING) {
-    return "G_TYPE_PARAM_STRING";
-  }
-  else if (_gtype == G_TYPE_PARAM_PARAM) {
-    return "G_TYPE_PARAM_PARAM";
-  }
-  else if (_gtype == G_TYPE_PARAM_BOXED) {
-    return "G_TYPE_PARAM_BOXED";
-  }
-  else if (_gtype == G_TYPE_PARAM_POINTER) {
-    return "G_TYPE_PARAM_POINTER";
-  }
-  else if (_gtype == G_TYPE_PARAM_OBJECT) {
-    return "G_TYPE_PARAM_OBJECT";
-  }
-  else if (_gtype == G_TYPE_PARAM_UNICHAR) {
-    return "G_TYPE_PARAM_UNICHAR";
-  }
-  else if (_gtype == G_TYPE_PARAM_VALUE_ARRAY) {
-    return "G_TYPE_PARAM_VALUE_ARRAY";
-  }
-  else if (_gtype == G_TYPE_PARAM_OVERRIDE) {
-    return "G_TYPE_PARAM_OVERRIDE";
-  }
-  else if (_gtype == G_TYPE_PARAM_OVERRIDE) {
-    return "G_TYPE_PARAM_OVERRIDE";
-  }
-  else if (_gtype == G_TYPE_PARAM_GTYPE) {
-    return "G_TYPE_PARAM_GTYPE";
-  }
-  else if (_gtype == G_TYPE_PARAM_VARIANT) {
-    return "G_TYPE_PARAM_VARIANT";
-  }
-
-  return "UNKNOWN";
-}
-
+        main_writer.write_line('#include "girtypes.h"')
+        main_writer.write_line('#include <gmodule.h>')
+        main_writer.write_line("""
+#ifdef G_OS_UNIX
+#include <errno.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/types.h>
+#include <sys/wait.h>
+#include <unistd.h>
+#endif""")
+        main_writer.write_newline()
+        main_writer.write_line(_fundamental_tostring_source())
+        main_writer.write_line('''
 const gchar * get_type_name (GType type, gboolean * is_pointer) {
     const gchar *type_name;
     *is_pointer = FALSE;
@@ -976,9 +1352,8 @@ gint compare_param_specs (const void *a, const void *b) {
   return strcmp (g_param_spec_get_name (spec_a), g_param_spec_get_name (spec_b));
 }
 
-void print_object_properties(FILE *fp, GType object_type, char* namespace_name, char* node_type, char* gtype_name)
+void print_object_properties(FILE *fp, GType object_type, gpointer class, char* namespace_name, char* node_type, char* gtype_name)
 {
-  gpointer class;
   const gchar *object_class_name;
   guint arg;
   gchar flags[16], *pos;
@@ -992,7 +1367,6 @@ void print_object_properties(FILE *fp, GType object_type, char* namespace_name,
   gchar *default_value;
   if (G_TYPE_IS_OBJECT (object_type))
     {
-      class = g_type_class_ref (object_type);
       if (!class) {
         fprintf(stderr, "WARNING: Unable to list properties for %s %s.%s\\n", node_type, namespace_name, gtype_name);
 	    return;
@@ -1002,7 +1376,6 @@ void print_object_properties(FILE *fp, GType object_type, char* namespace_name,
 #if GLIB_MAJOR_VERSION > 2 || (GLIB_MAJOR_VERSION == 2 && GLIB_MINOR_VERSION >= 3)
   else if (G_TYPE_IS_INTERFACE (object_type))
     {
-      class = g_type_default_interface_ref (object_type);
       if (!class) {
         fprintf(stderr, "WARNING: Unable to list properties for %s %s.%s\\n", node_type, namespace_name, gtype_name);
 	    return;
@@ -1089,11 +1462,7 @@ void print_object_signals (FILE *fp, GType object_type, char* namespace_name, ch
   guint *signals, n_signals;
   guint sig;
 
-  if (G_TYPE_IS_CLASSED (object_type))
-    g_type_class_ref (object_type);
-  if (G_TYPE_IS_INTERFACE (object_type))
-    g_type_default_interface_ref (object_type);
-
+  /* The class or interface was referenced by print_type_infos() */
   if (G_TYPE_IS_INSTANTIATABLE (object_type) ||
       G_TYPE_IS_INTERFACE (object_type)) {
 
@@ -1236,80 +1605,630 @@ void output_object_signal (FILE *fp, GType object_type, char* namespace_name, ch
   fprintf(fp, "%s,%s,%s,%s,%s,%s,%s,%s,%s\\n", namespace_name, node_type, gtype_name, object_name, query_info.signal_name, ret_type, is_pointer ? "*" : "", flags, buffer);
 }
 
-void print_all_types() {''')
+FILE *gir_typeinfo_fp;
+FILE *gir_propinfo_fp;
+FILE *gir_signalinfo_fp;
+
+/* Points every record stream at stdout, or with GIR_ALLINFO opens
+   typeinfo.txt, propinfo.txt and signalinfo.txt in output_path. */
+int open_info_streams(GirInfoFormat formats, const char *output_path) {
+  gchar *filename;
+
+  gir_typeinfo_fp = stdout;
+  gir_propinfo_fp = stdout;
+  gir_signalinfo_fp = stdout;
+  if (formats != GIR_ALLINFO)
+    return 0;
+
+  filename = g_build_filename (output_path, "typeinfo.txt", NULL);
+  gir_typeinfo_fp = fopen (filename, "w");
+  g_free (filename);
+  filename = g_build_filename (output_path, "propinfo.txt", NULL);
+  gir_propinfo_fp = fopen (filename, "w");
+  g_free (filename);
+  filename = g_build_filename (output_path, "signalinfo.txt", NULL);
+  gir_signalinfo_fp = fopen (filename, "w");
+  g_free (filename);
+  if (gir_typeinfo_fp == NULL || gir_propinfo_fp == NULL || gir_signalinfo_fp == NULL) {
+    fprintf(stderr, "ERROR: Unable to open the info files in %s\\n", output_path);
+    return -1;
+  }
+  return 0;
+}
+
+void close_info_streams() {
+  if (gir_typeinfo_fp != stdout)
+    fclose (gir_typeinfo_fp);
+  if (gir_propinfo_fp != stdout)
+    fclose (gir_propinfo_fp);
+  if (gir_signalinfo_fp != stdout)
+    fclose (gir_signalinfo_fp);
+}
+
+/* Where a probe worker is, kept in memory shared with the parent so the
+   type it crashed on can be skipped and its output truncated */
+typedef struct {
+  gssize row;           /* row being probed, -1 outside a row */
+  long offsets[3];      /* stream sizes before the row */
+  char gtype_name[256];
+} GirProbeProgress;
+
+static GirProbeProgress *probe_progress = NULL;
+static gsize probe_resume_row = 0;
+
+static void begin_probe_row(gsize row, const char *gtype_name) {
+  FILE *streams[3] = { gir_typeinfo_fp, gir_propinfo_fp, gir_signalinfo_fp };
+  int k;
+
+  for (k = 0; k < 3; k++) {
+    fflush (streams[k]);
+    probe_progress->offsets[k] = ftell (streams[k]);
+  }
+  g_strlcpy (probe_progress->gtype_name, gtype_name, sizeof (probe_progress->gtype_name));
+  probe_progress->row = row;
+}
+
+/* Called once the row's output is written, so a crash after it (e.g. in
+   the next row's bookkeeping or at exit) does not truncate that output */
+static void end_probe_row() {
+  fflush (gir_typeinfo_fp);
+  fflush (gir_propinfo_fp);
+  fflush (gir_signalinfo_fp);
+  probe_progress->row = -1;
+}
+
+static GHashTable *exclude_gtypes = NULL;
+
+/* Reads the gtypes not to probe, one per line; lines starting with '#'
+   are comments. A missing file is only an error when required is set. */
+int load_exclude_gtypes(const char *filename, gboolean required) {
+  gchar *contents = NULL;
+  gchar **lines;
+  GError *error = NULL;
+  gsize i;
+
+  exclude_gtypes = g_hash_table_new_full (g_str_hash, g_str_equal, g_free, NULL);
+  if (!g_file_get_contents (filename, &contents, NULL, &error)) {
+    int result = 0;
+    if (required || !g_error_matches (error, G_FILE_ERROR, G_FILE_ERROR_NOENT)) {
+      fprintf(stderr, "ERROR: %s\\n", error->message);
+      result = -1;
+    }
+    g_error_free (error);
+    return result;
+  }
+
+  lines = g_strsplit (contents, "\\n", -1);
+  for (i = 0; lines[i] != NULL; i++) {
+    gchar *gtype_name = g_strstrip (lines[i]);
+    if (gtype_name[0] == '\\0' || gtype_name[0] == '#')
+      continue;
+    g_hash_table_add (exclude_gtypes, g_strdup (gtype_name));
+  }
+  g_strfreev (lines);
+  g_free (contents);
+  return 0;
+}
+
+/* The get_type functions of gtypes excluded when the probe was generated
+   are not linked in; they are looked up in the loaded libraries when the
+   gtype is no longer excluded at runtime */
+static gpointer lookup_get_type(const char *symbol) {
+  static GModule *program = NULL;
+  gpointer address = NULL;
+
+  if (program == NULL)
+    program = g_module_open (NULL, 0);
+  if (program == NULL || !g_module_symbol (program, symbol, &address))
+    return NULL;
+  return address;
+}
+
+gboolean is_gtype_excluded(const char *gtype_name) {
+  return exclude_gtypes != NULL && gtype_name != NULL && g_hash_table_contains (exclude_gtypes, gtype_name);
+}
+
+static void print_type_info(const GirTypeInfo *info, GirInfoFormat formats) {
+  GType gtype;
+  gpointer class = NULL;
+
+  if (info->get_type_func != NULL) {
+    gtype = info->get_type_func ();
+  } else if (info->get_type_symbol != NULL) {
+    GType (*get_type_func) (void) = (GType (*) (void)) lookup_get_type (info->get_type_symbol);
+    if (get_type_func == NULL) {
+      fprintf(stderr, "WARNING: %s not found, skipping %s\\n", info->get_type_symbol, info->gtype_name);
+      return;
+    }
+    gtype = get_type_func ();
+  } else {
+    gtype = g_type_from_name (info->type_from_name);
+  }
+
+  if (formats & GIR_TYPEINFO)
+    fprintf (gir_typeinfo_fp, "%s,%s,%s,%s,%s,%s\\n", info->namespace_name, info->node_type, info->gtype_name,
+             info->ctype, info->get_type, g_type_fundamental_tostring (gtype));
+
+  if ((formats & (GIR_PROPERTYINFO | GIR_SIGNALINFO)) == 0)
+    return;
+
+  /* Property and signal records share one class reference */
+  if (G_TYPE_IS_CLASSED (gtype))
+    class = g_type_class_ref (gtype);
+  else if (G_TYPE_IS_INTERFACE (gtype))
+    class = g_type_default_interface_ref (gtype);
+
+  if (formats & GIR_PROPERTYINFO)
+    print_object_properties (gir_propinfo_fp, gtype, class, (char*)info->namespace_name, (char*)info->node_type, (char*)info->gtype_name);
+  if (formats & GIR_SIGNALINFO)
+    print_object_signals (gir_signalinfo_fp, gtype, (char*)info->namespace_name, (char*)info->node_type, (char*)info->gtype_name);
+}
+
+void print_type_infos(const GirTypeInfo *infos, gsize n_infos, GirInfoFormat formats) {
+  gsize i;
+
+  /* A restarted worker continues after the type its predecessor crashed on */
+  for (i = probe_resume_row; i < n_infos; i++) {
+    const GirTypeInfo *info = &infos[i];
+
+    /* Checked before get_type is called, which is what may crash */
+    if (is_gtype_excluded (info->gtype_name))
+      continue;
+
+    if (probe_progress != NULL)
+      begin_probe_row (i, info->gtype_name);
+    print_type_info (info, formats);
+    if (probe_progress != NULL)
+      end_probe_row ();
+  }
+}
+
+/* One generated print function; each walks a single GirTypeInfo table */
+typedef struct {
+  const char *namespace_name;
+  const char *kind;
+  void (*print_func) (void);
+} GirProbeTask;
+
+static gboolean task_needs_gtk(const GirProbeTask *task);
+
+/* GTK is initialized the first time a task needs it, so namespaces that do
+   not depend on it are probed without a display. In a probe worker every
+   worker opens its own display connection. */
+static gboolean init_gtk() {
+#ifdef GIR_NEEDS_GTK
+  static gboolean initialized = FALSE;
+
+  if (!initialized) {
+    if (!gtk_init_check (NULL, NULL))
+      return FALSE;
+    initialized = TRUE;
+  }
+#endif
+  return TRUE;
+}
+
+static void run_probe_task(const GirProbeTask *task) {
+  if (task_needs_gtk (task) && !init_gtk ()) {
+    fprintf(stderr, "WARNING: skipping %s %s, GTK could not be initialized\\n", task->namespace_name, task->kind);
+    return;
+  }
+  fprintf(stderr, "processing %s %s....\\n", task->namespace_name, task->kind);
+  task->print_func ();
+}
+
+#ifdef G_OS_UNIX
+typedef struct {
+  FILE *files[3];
+  pid_t pid;
+  gsize resume_row;
+  gboolean done;
+} GirProbeWorker;
+
+static pid_t start_probe_worker(const GirProbeTask *task, GirProbeWorker *worker, GirProbeProgress *progress) {
+  pid_t pid;
+
+  fflush (stdout);
+  fflush (stderr);
+  pid = fork ();
+  if (pid != 0)
+    return pid;
+
+  /* New FILEs so nothing buffered in the parent is written twice */
+  gir_typeinfo_fp = fdopen (dup (fileno (worker->files[0])), "w");
+  gir_propinfo_fp = fdopen (dup (fileno (worker->files[1])), "w");
+  gir_signalinfo_fp = fdopen (dup (fileno (worker->files[2])), "w");
+  if (gir_typeinfo_fp == NULL || gir_propinfo_fp == NULL || gir_signalinfo_fp == NULL)
+    _exit (1);
+  probe_progress = progress;
+  probe_progress->row = -1;
+  probe_resume_row = worker->resume_row;
+  run_probe_task (task);
+  /* _exit() does not flush stdio buffers */
+  fflush (gir_typeinfo_fp);
+  fflush (gir_propinfo_fp);
+  fflush (gir_signalinfo_fp);
+  _exit (0);
+}
+
+static void copy_probe_output(GirProbeWorker *worker) {
+  FILE *streams[3] = { gir_typeinfo_fp, gir_propinfo_fp, gir_signalinfo_fp };
+  char buffer[8192];
+  size_t n;
+  int k;
+
+  for (k = 0; k < 3; k++) {
+    rewind (worker->files[k]);
+    while ((n = fread (buffer, 1, sizeof (buffer), worker->files[k])) > 0)
+      fwrite (buffer, 1, n, streams[k]);
+    fclose (worker->files[k]);
+  }
+}
+
+/* Drops the output of the row a worker crashed on so a restarted worker
+   appends after the last complete row */
+static void truncate_probe_output(GirProbeWorker *worker, GirProbeProgress *progress) {
+  int k;
+
+  for (k = 0; k < 3; k++) {
+    int fd = fileno (worker->files[k]);
+    if (ftruncate (fd, progress->offsets[k]) != 0 || lseek (fd, progress->offsets[k], SEEK_SET) < 0) {
+      perror ("ERROR: Unable to truncate probe output");
+      exit (1);
+    }
+  }
+}
+
+static char * describe_exit_status(int status) {
+  if (WIFSIGNALED (status))
+    return g_strdup_printf ("%s", g_strsignal (WTERMSIG (status)));
+  return g_strdup_printf ("exit status %d", WEXITSTATUS (status));
+}
+
+/* Runs the tasks in up to jobs forked workers, each writing to its own
+   temporary files, and copies their output to the record streams in task
+   order. A worker that dies is restarted after the type it died on. */
+int run_probe_tasks(const GirProbeTask *tasks, gsize n_tasks, int jobs) {
+  GirProbeProgress *progress;
+  GirProbeWorker *workers;
+  gsize next_task = 0;
+  gsize next_output = 0;
+  int running = 0;
+  int crashed = 0;
+
+  progress = mmap (NULL, n_tasks * sizeof (GirProbeProgress), PROT_READ | PROT_WRITE, MAP_SHARED | MAP_ANON, -1, 0);
+  if (progress == MAP_FAILED) {
+    perror ("WARNING: Unable to share probe progress, probing in one process");
+    for (next_task = 0; next_task < n_tasks; next_task++)
+      run_probe_task (&tasks[next_task]);
+    return 0;
+  }
+  workers = g_new0 (GirProbeWorker, n_tasks);
+
+  while (next_output < n_tasks) {
+    GirProbeWorker *worker = NULL;
+    gsize w;
+    pid_t pid;
+    int status;
+
+    while (running < jobs && next_task < n_tasks) {
+      int k;
+      worker = &workers[next_task];
+      for (k = 0; k < 3; k++) {
+        worker->files[k] = tmpfile ();
+        if (worker->files[k] == NULL) {
+          perror ("ERROR: Unable to create probe output file");
+          exit (1);
+        }
+      }
+      worker->pid = start_probe_worker (&tasks[next_task], worker, &progress[next_task]);
+      if (worker->pid < 0) {
+        perror ("ERROR: Unable to start probe worker");
+        exit (1);
+      }
+      running++;
+      next_task++;
+    }
+
+    pid = waitpid (-1, &status, 0);
+    if (pid < 0) {
+      if (errno == EINTR)
+        continue;
+      perror ("ERROR: Unable to wait for probe worker");
+      exit (1);
+    }
+    for (w = next_output; w < next_task; w++) {
+      if (workers[w].pid == pid && !workers[w].done)
+        break;
+    }
+    if (w == next_task)
+      continue;
+    worker = &workers[w];
+    running--;
+
+    if (WIFEXITED (status) && WEXITSTATUS (status) == 0) {
+      worker->done = TRUE;
+    } else {
+      char *reason = describe_exit_status (status);
+      crashed++;
+      if (progress[w].row < 0) {
+        fprintf(stderr, "WARNING: %s %s failed outside a type (%s), its output may be incomplete\\n",
+                tasks[w].namespace_name, tasks[w].kind, reason);
+        worker->done = TRUE;
+      } else {
+        fprintf(stderr, "WARNING: %s %s crashed on %s (%s), skipping it\\n",
+                tasks[w].namespace_name, tasks[w].kind, progress[w].gtype_name, reason);
+        truncate_probe_output (worker, &progress[w]);
+        worker->resume_row = progress[w].row + 1;
+        worker->pid = start_probe_worker (&tasks[w], worker, &progress[w]);
+        if (worker->pid < 0) {
+          perror ("ERROR: Unable to restart probe worker");
+          exit (1);
+        }
+        running++;
+      }
+      g_free (reason);
+    }
+
+    while (next_output < next_task && workers[next_output].done) {
+      copy_probe_output (&workers[next_output]);
+      next_output++;
+    }
+  }
+
+  g_free (workers);
+  munmap (progress, n_tasks * sizeof (GirProbeProgress));
+  if (crashed > 0)
+    fprintf(stderr, "WARNING: %d probe workers crashed, see the warnings above\\n", crashed);
+  return crashed;
+}
+#else
+int run_probe_tasks(const GirProbeTask *tasks, gsize n_tasks, int jobs) {
+  gsize i;
+
+  for (i = 0; i < n_tasks; i++)
+    run_probe_task (&tasks[i]);
+  return 0;
+}
+#endif
+
+static const GirProbeTask probe_tasks[] = {''')
 
         header_writer.write_line("#ifndef _girtypes_h")
         header_writer.write_line("#define _girtypes_h")
         header_writer.write_newline()
         header_writer.write_line("""#include <stdio.h>
 #include <glib-2.0/glib-object.h>
+#ifdef GIR_NEEDS_GTK
 #include <gtk/gtk.h>
+#endif
+
+/* Read at startup unless --exclude=FILE is given; set by CMakeLists.txt
+   to the exclude-gtypes.txt copied next to the generated sources */
+#ifndef GIR_EXCLUDE_GTYPES_FILE
+#define GIR_EXCLUDE_GTYPES_FILE "exclude-gtypes.txt"
+#endif
 
 const char * g_type_fundamental_tostring(GType gtype);
-void print_object_properties(FILE *fp, GType object_type, char* namespace_name, char* node_type, char* gtype_name);
+void print_object_properties(FILE *fp, GType object_type, gpointer class, char* namespace_name, char* node_type, char* gtype_name);
 void print_object_signals(FILE *fp, GType object_type, char* namespace_name, char* node_type, char* gtype_name);
-void output_object_signal(FILE *fp, GType object_type, char* namespace_name, char* node_type, char* gtype_name, const gchar *object_name, guint signal_id);""")
-
-        with open(outputCmakeFilename, 'wb') as c:
-            with open(outputMainFilename, 'wb') as m:
-                with open(outputHeaderFilename, 'wb') as h:
-                    for f in filenames:
-                        path, filename = os.path.split(f)
-                        if options.typeinfo == True or options.propertyinfo == True or options.signalinfo == True:
-                            filename, file_extension = os.path.splitext(filename)
-                            filename += '.c'
-                        outputFilename = os.path.join(outputPath, filename)
-                        cmake_writer.write_line("""set(PROJECT_SOURCES ${PROJECT_SOURCES} ${CMAKE_CURRENT_SOURCE_DIR}/%s)""" % (filename,))
-                        with open(outputFilename, 'wb') as o:
-                            cmake_code_context = typeinformation_gir(exclude_gtypes, exclude_headers, cmake_code_context, f, o, cmake_writer, header_writer, main_writer, infoformat)
-                            o.flush()
-                        if options.typeinfo == True:
-                            # Write unregistered ctypes
-                            filename, file_extension = os.path.splitext(filename)
-                            filename += '_ctypes.c'
-                            outputFilename = os.path.join(outputPath, filename)
-                            cmake_writer.write_line("""set(PROJECT_SOURCES ${PROJECT_SOURCES} ${CMAKE_CURRENT_SOURCE_DIR}/%s)""" % (filename,))
-                            with open(outputFilename, 'wb') as o:
-                                cmake_code_context = typeinformation_ctypes(exclude_gtypes, exclude_headers, cmake_code_context, f, o, cmake_writer, header_writer, main_writer, infoformat)
-                                o.flush()
-                    # Write registered types
-                    filename = 'registered.c'
-                    outputFilename = os.path.join(outputPath, filename)
-                    cmake_writer.write_line("""set(PROJECT_SOURCES ${PROJECT_SOURCES} ${CMAKE_CURRENT_SOURCE_DIR}/%s)""" % (filename,))
-                    with open(outputFilename, 'wb') as o:
-                        cmake_code_context = typeinformation_registered(exclude_gtypes, exclude_headers, cmake_code_context, f, o, cmake_writer, header_writer, main_writer, infoformat)
-                        o.flush()
-                    cmake_writer.write_line("""string(REPLACE ";" " " CMAKE_C_FLAGS "${CMAKE_C_FLAGS}")""")
-                    cmake_writer.write_line("""add_executable (girtypes ${PROJECT_SOURCES})""")
-                    cmake_writer.write_line("""target_include_directories (girtypes PUBLIC ${PROJECT_INCLUDE_DIRECTORIES})""")
-                    cmake_writer.write_line("""target_link_directories (girtypes PUBLIC ${PROJECT_LINK_DIRECTORIES})""")
-                    cmake_writer.write_line("""target_link_libraries (girtypes ${PROJECT_LIBRARIES})""")
-                    header_writer.write_newline()
-                    header_writer.write_line("""#endif /* _girtypes_h */""")
-                    h.write(header_writer.get_encoded_source())
-                    h.flush()
-                main_writer.write_line("""}
+void output_object_signal(FILE *fp, GType object_type, char* namespace_name, char* node_type, char* gtype_name, const gchar *object_name, guint signal_id);
+
+/* Record streams written by print_type_infos(), combined as a mask */
+typedef enum {
+  GIR_TYPEINFO = 1 << 0,
+  GIR_PROPERTYINFO = 1 << 1,
+  GIR_SIGNALINFO = 1 << 2,
+  GIR_ALLINFO = GIR_TYPEINFO | GIR_PROPERTYINFO | GIR_SIGNALINFO
+} GirInfoFormat;
+
+/* One probed type; the GType comes from get_type_func, from the function
+   named get_type_symbol, or from g_type_from_name(type_from_name). */
+typedef struct {
+  const char *namespace_name;
+  const char *node_type;
+  const char *gtype_name;
+  const char *ctype;
+  const char *get_type;
+  GType (*get_type_func) (void);
+  const char *get_type_symbol;
+  const char *type_from_name;
+} GirTypeInfo;
+
+extern FILE *gir_typeinfo_fp;
+extern FILE *gir_propinfo_fp;
+extern FILE *gir_signalinfo_fp;
+
+int open_info_streams(GirInfoFormat formats, const char *output_path);
+void close_info_streams();
+int load_exclude_gtypes(const char *filename, gboolean required);
+gboolean is_gtype_excluded(const char *gtype_name);
+void print_type_infos(const GirTypeInfo *infos, gsize n_infos, GirInfoFormat formats);""")
+
+        # Generated files are only written when their content changed, so an
+        # unchanged generation does not make CMake rebuild the probe
+        typeinfo_context = TypeinfoContext(infoformat, exclude_gtypes, exclude_headers, parse_cache)
+        needs_gtk, source_filenames = generate_typeinfo(typeinfo_context, filenames, outputPath, cmake_writer,
+                                                        cmake_code_context, header_writer, main_writer, options.jobs)
+        if len(needs_gtk) > 0:
+            # Registered types include those of the GTK namespaces
+            needs_gtk.add("registered")
+        # Write registered types
+        filename = 'registered.c'
+        outputFilename = os.path.join(outputPath, filename)
+        cmake_writer.write_line("""set(PROJECT_SOURCES ${PROJECT_SOURCES} ${CMAKE_CURRENT_SOURCE_DIR}/%s)""" % (filename,))
+        o = io.BytesIO()
+        typeinformation_registered(exclude_gtypes, exclude_headers, o, header_writer, main_writer, infoformat)
+        write_if_changed(outputFilename, o.getvalue())
+        source_filenames.append(filename)
+        cmake_writer.write_line("""string(REPLACE ";" " " CMAKE_C_FLAGS "${CMAKE_C_FLAGS}")""")
+        cmake_code_context.write_remove_duplicates(cmake_writer)
+        cmake_writer.write_line("""add_executable (girtypes ${PROJECT_SOURCES})""")
+        cmake_writer.write_line("""target_include_directories (girtypes PUBLIC ${PROJECT_INCLUDE_DIRECTORIES})""")
+        cmake_writer.write_line("""target_link_directories (girtypes PUBLIC ${PROJECT_LINK_DIRECTORIES})""")
+        cmake_writer.write_line("""target_link_libraries (girtypes ${PROJECT_LIBRARIES})""")
+        if options.unitybuild == True:
+            cmake_code_context.write_unity_build(cmake_writer, "girtypes")
+        if len(needs_gtk) > 0:
+            cmake_writer.write_line("""target_compile_definitions (girtypes PRIVATE GIR_NEEDS_GTK)""")
+        cmake_writer.write_line("""target_compile_definitions (girtypes PRIVATE "GIR_EXCLUDE_GTYPES_FILE=\\"${CMAKE_CURRENT_SOURCE_DIR}/exclude-gtypes.txt\\"")""")
+        header_writer.write_newline()
+        header_writer.write_line("""#endif /* _girtypes_h */""")
+        write_if_changed(outputHeaderFilename, header_writer.get_encoded_source())
+        main_writer.write_line("""};
+""")
+        main_writer.write_line("""/* Namespaces that depend on Gtk or Gdk, see init_gtk() */""")
+        main_writer.write_line("""static const char *gtk_namespaces[] = {""")
+        for namespace_name in sorted(needs_gtk):
+            main_writer.write_line("""  %s,""" % (_c_string(namespace_name),))
+        main_writer.write_line("""  NULL
+};
+
+static gboolean task_needs_gtk(const GirProbeTask *task) {
+  int i;
+
+  for (i = 0; gtk_namespaces[i] != NULL; i++) {
+    if (!strcmp (gtk_namespaces[i], task->namespace_name))
+      return TRUE;
+  }
+  return FALSE;
+}
+
+void print_all_types(int jobs) {
+    run_probe_tasks(probe_tasks, G_N_ELEMENTS(probe_tasks), jobs);
+}
+
+static int default_jobs(void) {
+#if GLIB_CHECK_VERSION(2, 36, 0)
+    return g_get_num_processors();
+#elif defined(G_OS_UNIX) && defined(_SC_NPROCESSORS_ONLN)
+    long count = sysconf(_SC_NPROCESSORS_ONLN);
+    return count > 0 ? (int) count : 1;
+#else
+    return 1;
+#endif
+}
 
 int main(int argc, char *argv[]) {
-    gtk_init(&argc, &argv);
-    print_all_types();
+    const char *output_path = ".";
+    const char *exclude_filename = GIR_EXCLUDE_GTYPES_FILE;
+    gboolean exclude_required = FALSE;
+    int jobs = default_jobs();
+    int i;
+
+#if !GLIB_CHECK_VERSION(2, 36, 0)
+    g_type_init();
+#endif
+    for (i = 1; i < argc; i++) {
+        if (g_str_has_prefix(argv[i], "--exclude=")) {
+            exclude_filename = argv[i] + strlen("--exclude=");
+            exclude_required = TRUE;
+        } else if (g_str_has_prefix(argv[i], "--jobs=")) {
+            jobs = atoi(argv[i] + strlen("--jobs="));
+            if (jobs < 1)
+                jobs = default_jobs();
+        } else {
+            output_path = argv[i];
+        }
+    }
+    if (load_exclude_gtypes(exclude_filename, exclude_required) != 0)
+        exit(1);
+    if (open_info_streams(%s, output_path) != 0)
+        exit(1);
+    print_all_types(jobs);
+    close_info_streams();
     exit(0);
-}""")
-                m.write(main_writer.get_encoded_source())
-                m.flush()
-            c.write(cmake_writer.get_encoded_source())
-            c.flush()
-    else:
-        for f in filenames:
-            path, filename = os.path.split(f)
-            outputFilename = os.path.join(outputPath, filename)
-
-            with open(outputFilename, 'wb') as o:
-                if options.passthrough == True:
-                    passthrough_gir(f, o)
+}""" % (INFO_FORMATS[infoformat],))
+        write_if_changed(outputMainFilename, main_writer.get_encoded_source())
+        write_if_changed(outputCmakeFilename, cmake_writer.get_encoded_source())
+        if options.buildprobe == True:
+            # exclude-gtypes.txt is read when the probe runs and is not part of the key
+            probe_filenames = ['CMakeLists.txt', 'girtypes.c', 'girtypes.h'] + source_filenames
+            key = probe_digest(outputPath, probe_filenames, cmake_code_context.packages())
+            probe_cache = None
+            if options.cache_path:
+                if key is None:
+                    # Without the package versions a cached probe could be linked against old libraries
+                    sys.stderr.write('WARNING: Unable to get package versions from pkg-config, not using the probe cache\n')
                 else:
-                    process_gir(f, o, exclude_registered)
-                o.flush()
+                    probe_cache = ProbeCache(os.path.abspath(os.path.expanduser(options.cache_path)))
+            try:
+                probe_filename, cached = build_probe(outputPath, os.path.join(outputPath, 'build'), key, probe_cache)
+            except (OSError, subprocess.CalledProcessError) as e:
+                _error('unable to build the information program: %s' % (e, ))
+            if cached == True:
+                sys.stderr.write('%s: reused cached information program\n' % (probe_filename, ))
+    else:
+        if options.stream == True and options.passthrough == True:
+            _error('--stream is not supported with --passthrough')
+        if options.profile_path:
+            if options.stream == True:
+                _error('--profile is not supported with --stream')
+            profile_path = os.path.abspath(os.path.expanduser(options.profile_path))
+            os.makedirs(profile_path, exist_ok=True)
+        else:
+            profile_path = None
+        if options.stats and options.passthrough == True:
+            _error('--stats is not supported with --passthrough')
+        if options.tracememory:
+            if options.stream == True:
+                _error('--tracememory is not supported with --stream')
+            if options.profile_path:
+                _error('--tracememory is not supported with --profile')
+        if options.maxmemory is not None:
+            if options.maxmemory <= 0:
+                _error('--maxmemory must be a positive number')
+            max_memory = options.maxmemory * 1024 * 1024
+            if set_memory_limit(max_memory) == False:
+                _error('--maxmemory is not supported on this platform')
+        else:
+            max_memory = None
+        context = GIRCheckContext(outputPath,
+                                  passthrough=options.passthrough,
+                                  exclude_registered=exclude_registered,
+                                  parse_cache=parse_cache,
+                                  stream=options.stream,
+                                  profile_path=profile_path,
+                                  collect_stats=bool(options.stats),
+                                  trace_memory=bool(options.tracememory),
+                                  max_memory=max_memory)
+        if options.identifierrules:
+            if not os.path.exists(options.identifierrules):
+                _error('%s: no such identifierrules file' % (options.identifierrules, ))
+            try:
+                context.identifier_converter = load_identifier_rules(options.identifierrules)
+            except ValueError as e:
+                _error(str(e))
+        if options.sharesymbols == True or options.symbolindex:
+            if options.passthrough == True:
+                _error('--sharesymbols is not supported with --passthrough')
+            if options.symbolindex:
+                index_file = SymbolIndexFile(os.path.abspath(os.path.expanduser(options.symbolindex)))
+                index_file.load()
+            else:
+                index_file = None
+            context.ctype_table = build_ctype_table(context, filenames, options.jobs, index_file)
+            if index_file is not None:
+                index_file.save()
+        manifest = BuildManifest(outputPath)
+        # Profiled and measured runs process every file, not just the out of date ones
+        if options.force == False and profile_path is None and not options.stats and not options.tracememory:
+            manifest.load()
+        if options.stats:
+            stats = WriterStats()
+        else:
+            stats = None
+        if options.tracememory:
+            memory_report = {}
+        else:
+            memory_report = None
+        failed = check_gir_files(context, filenames, options.jobs, manifest, stats, memory_report)
+        if stats is not None:
+            stats.save(os.path.abspath(os.path.expanduser(options.stats)))
+        if memory_report is not None:
+            save_memory_report(os.path.abspath(os.path.expanduser(options.tracememory)), memory_report)
+        if failed > 0:
+            _error('%d of %d GIR files failed' % (failed, len(filenames)))
     return 0
 
 if __name__ == "__main__":
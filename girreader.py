@@ -0,0 +1,162 @@
+# -*- Mode: Python -*-
+# GObject-Introspection - a framework for introspecting GObject libraries
+# Copyright (C) 2008  Johan Dahlin
+# Copyright (C) 2019  Rene Sugar
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+#
+
+import os
+from xml.etree.ElementTree import iterparse
+
+from giscanner import ast
+from giscanner.girparser import GIRParser
+
+from girwriter import COMPATIBLE_GIR_VERSION
+
+CORE_NS = "http://www.gtk.org/introspection/core/1.0"
+C_NS = "http://www.gtk.org/introspection/c/1.0"
+GLIB_NS = "http://www.gtk.org/introspection/glib/1.0"
+
+def _corens(tag):
+    return '{%s}%s' % (CORE_NS, tag)
+
+def _glibns(tag):
+    return '{%s}%s' % (GLIB_NS, tag)
+
+def _cns(tag):
+    return '{%s}%s' % (C_NS, tag)
+
+class StreamingGIRParser(GIRParser):
+    """Parses a GIR file incrementally instead of building the whole tree.
+
+    open() reads up to the <namespace> element and returns a namespace
+    holding only the repository header. nodes() then yields the top-level
+    nodes one at a time in file order; each node lives in its own namespace
+    object and its XML subtree is discarded once it has been parsed, so
+    memory use is bounded by the largest single node.
+    """
+
+    def open(self, filename):
+        filename = os.path.abspath(filename)
+        self._filename_stack.append(filename)
+        self._namespace = None
+        self._pkgconfig_packages = set()
+        self._includes = set()
+        self._c_includes = set()
+        self._c_prefix = None
+        self._events = iterparse(filename, events=('start', 'end'))
+
+        depth = 0
+        for event, elem in self._events:
+            if event == 'start':
+                depth += 1
+                if depth == 1:
+                    self._check_repository(elem)
+                elif depth == 2 and elem.tag == _corens('namespace'):
+                    self._namespace_element = elem
+                    self._namespace_attrib = dict(elem.attrib)
+                    self._namespace = self._new_namespace()
+                    return self._namespace
+                continue
+            depth -= 1
+            if depth == 1:
+                if elem.tag == _corens('include'):
+                    self._parse_include(elem)
+                elif elem.tag == _corens('package'):
+                    self._parse_pkgconfig_package(elem)
+                elif elem.tag == _cns('include'):
+                    self._parse_c_include(elem)
+        raise SystemExit("%s: No namespace element" % (self._get_current_file(), ))
+
+    def nodes(self):
+        parser_methods = self._get_parser_methods()
+        namespace_element = self._namespace_element
+        depth = 2
+        for event, elem in self._events:
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                # </namespace>
+                break
+            if depth != 2:
+                continue
+            method = parser_methods.get(elem.tag)
+            if method is not None:
+                # Parse into a namespace of its own so nothing keeps the
+                # node alive after the consumer is done with it
+                self._namespace = self._new_namespace()
+                method(elem)
+                nodes = list(self._namespace.values())
+                self._namespace = None
+                for node in nodes:
+                    yield node
+            elem.clear()
+            namespace_element.remove(elem)
+        self._events = None
+        self._namespace_element = None
+        self._filename_stack.pop()
+
+    def _check_repository(self, root):
+        assert root.tag == _corens('repository')
+        version = root.attrib['version']
+        if version != COMPATIBLE_GIR_VERSION:
+            raise SystemExit("%s: Incompatible version %s (supported: %s)" %
+                             (self._get_current_file(), version, COMPATIBLE_GIR_VERSION))
+
+    def _new_namespace(self):
+        attrib = self._namespace_attrib
+        identifier_prefixes = attrib.get(_cns('identifier-prefixes'))
+        if identifier_prefixes:
+            identifier_prefixes = identifier_prefixes.split(',')
+        symbol_prefixes = attrib.get(_cns('symbol-prefixes'))
+        if symbol_prefixes:
+            symbol_prefixes = symbol_prefixes.split(',')
+        namespace = ast.Namespace(attrib['name'],
+                                  attrib['version'],
+                                  identifier_prefixes=identifier_prefixes,
+                                  symbol_prefixes=symbol_prefixes)
+        if 'shared-library' in attrib:
+            namespace.shared_libraries = attrib['shared-library'].split(',')
+        namespace.includes = self._includes
+        namespace.c_includes = self._c_includes
+        namespace.exported_packages = self._pkgconfig_packages
+        return namespace
+
+    def _get_parser_methods(self):
+        parser_methods = {
+            _corens('alias'): self._parse_alias,
+            _corens('bitfield'): self._parse_enumeration_bitfield,
+            _corens('callback'): self._parse_callback,
+            _corens('class'): self._parse_object_interface,
+            _corens('enumeration'): self._parse_enumeration_bitfield,
+            _corens('interface'): self._parse_object_interface,
+            _corens('record'): self._parse_record,
+            _corens('union'): self._parse_union,
+            _glibns('boxed'): self._parse_boxed}
+
+        # Not every giscanner version knows about these elements
+        if hasattr(self, '_parse_doc_section'):
+            parser_methods[_corens('docsection')] = self._parse_doc_section
+
+        if not self._types_only:
+            parser_methods[_corens('constant')] = self._parse_constant
+            parser_methods[_corens('function')] = self._parse_function
+            if hasattr(self, '_parse_function_macro'):
+                parser_methods[_corens('function-macro')] = self._parse_function_macro
+        return parser_methods
@@ -20,52 +20,24 @@
 #
 
 import os
-from collections import namedtuple
+import time
 
 import giscanner
 from giscanner import ast
 from giscanner.xmlwriter import XMLWriter
 
+from symbolindex import SymbolIndex
+from identifiers import IdentifierConverter
+
+# Shared by all writers in a process so conversions are only done once
+_default_identifier_converter = IdentifierConverter()
+
 # Bump this for *incompatible* changes to the .gir.
 # Compatible changes we just make inline
 COMPATIBLE_GIR_VERSION = '1.2'
 
-def _add_prefix(identifier, prefix):
-    if identifier.startswith(prefix) == False:
-        if identifier[0].isupper():
-            identifier = prefix + identifier
-        else:
-            identifier = prefix + "_" + identifier
-    return identifier
-
-def _type_to_glib_type_name(name, identifier_prefixes):
-    if identifier_prefixes == "cairo":
-        identifier_prefixes = "Cairo"
-    name = _add_prefix(name, identifier_prefixes)
-
-    return name
-
-def _type_to_glib_get_type(name, identifier_prefixes):
-    if identifier_prefixes == "cairo":
-        identifier_prefixes = "Cairo"
-    name = _add_prefix(name, identifier_prefixes)
-
-    get_type = ''.join('_' + char.lower() if char.isupper() else char for char in name).lstrip('_')
-    get_type += '_get_type'
-
-    get_type = get_type.replace("_d_bus_", "_dbus_")
-    if get_type.startswith("g_i_o_"):
-        get_type = get_type.replace("g_i_o_", "g_io_")
-    if get_type.startswith("x_r_r_"):
-        get_type = get_type.replace("x_r_r_", "xrr_")
-    if get_type.startswith("g_i_repository_"):
-        get_type = get_type.replace("g_i_repository_", "g_irepository_")
-    if get_type.startswith("g_i_"):
-        get_type = get_type.replace("g_i_", "g_irepository_")
-    if identifier_prefixes == "Cairo":
-        get_type = get_type.replace("cairo_", "cairo_gobject_")
-        
-    return get_type
+# Amount of XML text buffered before it is encoded and written when streaming
+STREAM_CHUNK_SIZE = 64 * 1024
 
 def _type_to_ctype(name, transfer=None, is_rettype=False):
     if is_rettype == True and name is not None:
@@ -147,11 +119,267 @@ def _get_array_type(elem_type, array_type=None, transfer="full", is_return=False
 
     return None
 
-class GIRWriter(XMLWriter):
+class _StreamingData(object):
+    """Stands in for XMLWriter's StringIO buffer and writes utf-8 encoded
+    chunks to a file as they fill up, so the document is never held whole."""
+
+    def __init__(self, f, chunk_size=STREAM_CHUNK_SIZE):
+        self._file = f
+        self._chunk_size = chunk_size
+        self._chunks = []
+        self._size = 0
+        self._position = 0
+
+    def write(self, text):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self._chunk_size:
+            self.flush()
+
+    def tell(self):
+        return self._position + self._size
+
+    def flush(self):
+        if self._chunks:
+            self._file.write(''.join(self._chunks).encode('utf-8'))
+            self._position += self._size
+            self._chunks = []
+            self._size = 0
+
+    def getvalue(self):
+        raise ValueError("GIRWriter output was streamed to a file")
 
-    def __init__(self, namespace, exclude_registered=None, sources_roots=[]):
+class _CtypeResolver(object):
+    """C type canonicalization and inference used by GIRWriter. Subclasses
+    set _namespace."""
+
+    # Optional WriterStats that counts hot path decisions; only GIRWriter sets it
+    stats = None
+
+    def _count(self, counter):
+        self.stats.increment(self._namespace.name, counter)
+
+    def _type_to_name(self, typeval):
+        if not typeval.resolved:
+            raise AssertionError("Caught unresolved type %r (ctype=%r)" % (typeval, typeval.ctype))
+        assert typeval.target_giname is not None
+        prefix = self._namespace.name + '.'
+        if typeval.target_giname.startswith(prefix):
+            return typeval.target_giname[len(prefix):]
+        return typeval.target_giname
+
+    # Canonicalize ctype for GObject. and GLib. types
+    def _canonicalize_ctype(self, base, is_const=False, is_element_type=False):
+        name  = None
+        ctype = None
+        if (base is None) or (is_element_type == True):
+            return (name, ctype)
+        
+        if is_const == True:
+            const_prefix = "const "
+        else:
+            const_prefix = ""
+        if base.startswith('GObject.'):
+            if self.stats is not None:
+                self._count('canonicalize_ctype.gobject')
+            name  = base
+            ctype = 'G' + name.split('.', 1)[1]
+            # NOTE: GCallback is already a pointer type
+            if (ctype != 'GCallback'):
+                ctype += '*'
+        elif base in ('GList', 'GSList', 'GLib.List', 'GLib.SList'):
+            if self.stats is not None:
+                self._count('canonicalize_ctype.list')
+            if base in ('GList', 'GSList'):
+                name = 'GLib.' + base[1:]
+            else:
+                name = base
+            ctype = 'G' + name.split('.', 1)[1]
+            ctype += '*'
+        elif base in ('GByteArray', 'GLib.ByteArray', 'GObject.ByteArray'):
+            if self.stats is not None:
+                self._count('canonicalize_ctype.byte_array')
+            name = 'GLib.ByteArray'
+            ctype = 'G' + name.split('.', 1)[1]
+            ctype += '*'
+        elif base in ('GArray', 'GPtrArray',
+                      'GLib.Array', 'GLib.PtrArray',
+                      'GObject.Array', 'GObject.PtrArray'):
+            if self.stats is not None:
+                self._count('canonicalize_ctype.array')
+            if '.' in base:
+                name = 'GLib.' + base.split('.', 1)[1]
+            else:
+                name = 'GLib.' + base[1:]
+            ctype = 'G' + name.split('.', 1)[1]
+            ctype += '*'
+        elif base in ('GHashTable', 'GLib.HashTable', 'GObject.HashTable'):
+            if self.stats is not None:
+                self._count('canonicalize_ctype.hash_table')
+            name = 'GLib.HashTable'
+            ctype = 'GHashTable'
+            ctype += '*'
+
+        if ctype is not None:
+            ctype = const_prefix + ctype
+        return (name, ctype)
+
+    def _type_to_key(self, typeval, transfer="full", is_return=False):
+        name = None
+        if isinstance(typeval, ast.Array):
+            if typeval.array_type != ast.Array.C:
+                name = typeval.array_type
+            else:
+                if typeval.complete_ctype:
+                    name = typeval.complete_ctype
+                elif typeval.ctype:
+                    name = typeval.ctype
+                else:
+                    # Make array type from element type
+                    if typeval.element_type.target_giname:
+                        name = typeval.element_type.target_giname
+                    elif typeval.element_type.target_fundamental:
+                        name = typeval.element_type.target_fundamental
+                    name = _get_array_type(typeval.element_type, array_type=name, transfer=transfer, is_return=is_return)
+        elif isinstance(typeval, ast.List):
+            name = typeval.name
+        elif isinstance(typeval, ast.Map):
+            name = 'GLib.HashTable'
+        else:
+            if typeval.target_giname:
+                # Keep the namespace so keys can be shared across namespaces
+                name = typeval.target_giname
+            elif typeval.target_fundamental:
+                name = typeval.target_fundamental
+        return name
+
+    def _get_element_type(self, parent, ntype, transfer=None, is_return=False):
+        array_ctype = None
+        if parent.complete_ctype:
+            array_ctype = parent.complete_ctype
+        elif parent.ctype:
+            array_ctype = parent.ctype
+
+        element_ctype = ''
+        if array_ctype is not None:
+            element_ctype = element_ctype.join(array_ctype.rsplit(" const*", 1))
+
+        # NOTE: Cannot derive element type from GArray*
+        if element_ctype == "GArray" or element_ctype == "const gchar":
+            element_ctype = None
+
+        # check " const*"
+        if element_ctype != array_ctype:
+            return element_ctype
+
+        element_ctype = ''
+        if array_ctype is not None:
+            element_ctype = element_ctype.join(array_ctype.rsplit("*", 1))
+
+        # NOTE: Cannot derive element type from GArray*
+        if element_ctype == "GArray" or element_ctype == "const gchar":
+            element_ctype = None
+
+        # check "*"
+        if element_ctype != array_ctype:
+            return element_ctype
+
+        return None
+
+    def _resolve_type_ctype(self, ntype, transfer=None, parent=None, is_return=False):
+        """Canonicalizes the C type of ntype in place. Returns (is_set_ctype,
+        ctype) for the c:type attribute."""
+        is_element_type_ = False
+        if parent is not None and isinstance(parent, ast.Array):
+            is_element_type_ = True
+        if isinstance(ntype, ast.Array) and ntype.complete_ctype is None and ntype.ctype is None:
+            name = ''
+            if ntype.array_type != ast.Array.C:
+                name = ntype.array_type
+            elif ntype.element_type.target_giname:
+                name = self._type_to_name(ntype.element_type)
+            elif ntype.element_type.target_fundamental:
+                name = ntype.element_type.target_fundamental
+            # NOTE: Update missing array ctype so element ctype can be added if it is missing
+            ntype.ctype = _get_array_type(ntype.element_type, array_type=name, transfer=transfer)
+            return (True, ntype.ctype)
+        elif ntype.complete_ctype:
+            # Canonicalize GObject. and GLib. types
+            name_ = None
+            ctype_ = None
+            is_const_ = ntype.is_const
+            is_out_ = False
+            if ntype.complete_ctype.startswith('const '):
+                is_const_ = True
+            if ntype.complete_ctype.endswith('**'):
+                is_out_ = True
+            if hasattr(ntype, 'name') and ntype.name:
+                name_ = ntype.name
+            elif hasattr(ntype, 'gtype_name') and ntype.gtype_name:
+                name_ = ntype.gtype_name
+            elif ntype.target_giname:
+                name_ = self._type_to_name(ntype)
+            elif ntype.target_fundamental:
+                name_ = ntype.target_fundamental
+            name_, ctype_ = self._canonicalize_ctype(name_, is_const_, is_element_type_)
+            if name_ is not None:
+                ntype.name = name_
+            if ctype_ is not None and ntype.complete_ctype != 'gpointer':
+                if is_out_ == True:
+                    ctype_ += '*'
+                ntype.complete_ctype = ctype_
+            return (True, ntype.complete_ctype)
+        elif ntype.ctype:
+            # Canonicalize GObject. and GLib. types
+            name_ = None
+            ctype_ = None
+            is_const_ = ntype.is_const
+            is_out_ = False
+            if ntype.ctype.startswith('const '):
+                is_const_ = True
+            if ntype.ctype.endswith('**'):
+                is_out_ = True
+            if hasattr(ntype, 'name') and ntype.name:
+                name_ = ntype.name
+            elif hasattr(ntype, 'gtype_name') and ntype.gtype_name:
+                name_ = ntype.gtype_name
+            elif ntype.target_giname:
+                name_ = self._type_to_name(ntype)
+            elif ntype.target_fundamental:
+                name_ = ntype.target_fundamental
+            name_, ctype_ = self._canonicalize_ctype(name_, is_const_, is_element_type_)
+            if name_ is not None:
+                ntype.name = name_
+            if ctype_ is not None and ntype.ctype != 'gpointer':
+                if is_out_ == True:
+                    ctype_ += '*'
+                ntype.ctype = ctype_
+            return (True, ntype.ctype)
+        elif parent:
+            if isinstance(parent, ast.Array):
+                ctype_ = self._get_element_type(parent, ntype, transfer, is_return)
+                if self.stats is not None:
+                    if ctype_ is not None:
+                        self._count('element_type.derived')
+                    else:
+                        self._count('element_type.not_derived')
+                if ctype_ is not None:
+                    return (True, ctype_)
+        return (False, None)
+
+class GIRWriter(XMLWriter, _CtypeResolver):
+
+    def __init__(self, namespace, exclude_registered=None, sources_roots=[], output=None, nodes=None, symbol_index=None,
+                 identifier_converter=None, stats=None, ctype_table=None):
         super(GIRWriter, self).__init__()
 
+        if output is not None:
+            # Stream to the output file instead of buffering the document;
+            # get_xml() and get_encoded_xml() are unavailable in this mode
+            header = self._data.getvalue()
+            self._data = _StreamingData(output)
+            self._data.write(header)
+
         if exclude_registered is None:
             self.exclude_registered = set()
         else:
@@ -162,25 +390,47 @@ class GIRWriter(XMLWriter):
             'To affect the contents of this file, edit the original C definitions,\n'
             'and/or use gtk-doc annotations. ')
         self.sources_roots = sources_roots
-        self.SymtableKey = namedtuple('SymtableKey', ['name', 'transfer', 'is_return'])
-        self.symbol_table  = {}
+        if identifier_converter is None:
+            self.identifier_converter = _default_identifier_converter
+        else:
+            self.identifier_converter = identifier_converter
+        # Top-level nodes to write in place of namespace.values(), e.g. from
+        # StreamingGIRParser.nodes(); they are written in the order given
+        self._nodes = nodes
+        # Optional WriterStats that records time spent per node kind and
+        # hot path counters
+        self.stats = stats
+        # Pass a table finalized from every file of a run to resolve C types
+        # from other namespaces; it already holds this namespace's C types
+        if ctype_table is None:
+            if symbol_index is None:
+                symbol_index = SymbolIndex()
+                if nodes is None:
+                    # First pass: collect every C type in the namespace so that
+                    # inferred C types do not depend on the order nodes are written.
+                    # Streamed nodes can only be read once, so the caller collects them.
+                    collect_symbols(namespace, symbol_index)
+            ctype_table = symbol_index.finalize()
+        self._ctype_table = ctype_table
         self._write_repository(namespace)
+        if output is not None:
+            self._data.flush()
 
     def _find_symbol(self, name, transfer="none", is_return=False):
-        key = self.SymtableKey(name=name, transfer=transfer, is_return=is_return)
-        if key in self.symbol_table:
-            ctype = self.symbol_table[key]
-            return (key, ctype)
-        return (key, None)
-
-    def _add_symbol(self, name, transfer="none", is_return=False, value=None):
-        (key, ctype) = self._find_symbol(name, transfer, is_return)
+        ctype = self._ctype_table.find(name, transfer, is_return)
+        if self.stats is not None:
+            self._count_find_symbol(name, transfer, is_return, ctype)
+        return ctype
+
+    def _count_find_symbol(self, name, transfer, is_return, ctype):
         if ctype is None:
-            if value is not None:
-                self.symbol_table[key] = [value]
-        else:
-            if value not in ctype:
-                self.symbol_table[key] = ctype.append(value)
+            self._count('find_symbol.miss')
+            return
+        self._count('find_symbol.hit')
+        if is_return == False and (transfer, name) in self._ctype_table.fallbacks:
+            self._count('find_symbol.return_fallback')
+        if (is_return, transfer, name) in self._ctype_table.ambiguous:
+            self._count('find_symbol.multiple_ctypes')
 
     def _write_repository(self, namespace):
         attrs = [
@@ -226,7 +476,11 @@ class GIRWriter(XMLWriter):
                     return 0, val
                 else:
                     return 1, val
-            for node in sorted(namespace.values(), key=nscmp):
+            if self._nodes is not None:
+                nodes = self._nodes
+            else:
+                nodes = sorted(namespace.values(), key=nscmp)
+            for node in nodes:
                 self._write_node(node)
 
     def _write_node(self, node):
@@ -248,18 +502,30 @@ class GIRWriter(XMLWriter):
 
             if (hasattr(node, 'gtype_name') == False) or (node.gtype_name is None):
                 if _is_registered_type(node, self.exclude_registered):
-                    node.gtype_name = _type_to_glib_type_name(node.name, identifier_prefix)
+                    node.gtype_name = self.identifier_converter.type_name(node.name, identifier_prefix)
 
             if (hasattr(node, 'get_type') == False) or (node.get_type is None):
                 if _is_registered_type(node, self.exclude_registered):
-                    node.get_type = _type_to_glib_get_type(node.name, identifier_prefix)
+                    node.get_type = self.identifier_converter.get_type(node.name, identifier_prefix)
 
             if (hasattr(node, 'ctype') == False) or (node.ctype is None):
                 if hasattr(node, 'gtype_name') and node.gtype_name is not None:
                     node.ctype = node.gtype_name
                 else:
-                    node.ctype = _type_to_glib_type_name(node.name, identifier_prefix)
+                    node.ctype = self.identifier_converter.type_name(node.name, identifier_prefix)
+
+        if self.stats is None:
+            self._dispatch_node(node)
+            return
 
+        start_size = self._data.tell()
+        start_time = time.perf_counter()
+        self._dispatch_node(node)
+        elapsed = time.perf_counter() - start_time
+        self.stats.add_node(self._namespace.name, node.__class__.__name__, elapsed,
+                            self._data.tell() - start_size)
+
+    def _dispatch_node(self, node):
         if isinstance(node, ast.Function):
             self._write_function(node)
         elif isinstance(node, ast.FunctionMacro):
@@ -485,122 +751,6 @@ class GIRWriter(XMLWriter):
             self._write_generic(parameter)
             self._write_type(parameter.type, transfer=parameter.transfer, parent=parent)
 
-    def _type_to_name(self, typeval):
-        if not typeval.resolved:
-            raise AssertionError("Caught unresolved type %r (ctype=%r)" % (typeval, typeval.ctype))
-        assert typeval.target_giname is not None
-        prefix = self._namespace.name + '.'
-        if typeval.target_giname.startswith(prefix):
-            return typeval.target_giname[len(prefix):]
-        return typeval.target_giname
-
-    # Canonicalize ctype for GObject. and GLib. types
-    def _canonicalize_ctype(self, base, is_const=False, is_element_type=False):
-        name  = None
-        ctype = None
-        if (base is None) or (is_element_type == True):
-            return (name, ctype)
-        
-        if is_const == True:
-            const_prefix = "const "
-        else:
-            const_prefix = ""
-        if base.startswith('GObject.'):
-            name  = base
-            ctype = 'G' + name.split('.', 1)[1]
-            # NOTE: GCallback is already a pointer type
-            if (ctype != 'GCallback'):
-                ctype += '*'
-        elif base in ('GList', 'GSList', 'GLib.List', 'GLib.SList'):
-            if base in ('GList', 'GSList'):
-                name = 'GLib.' + base[1:]
-            else:
-                name = base
-            ctype = 'G' + name.split('.', 1)[1]
-            ctype += '*'
-        elif base in ('GByteArray', 'GLib.ByteArray', 'GObject.ByteArray'):
-            name = 'GLib.ByteArray'
-            ctype = 'G' + name.split('.', 1)[1]
-            ctype += '*'
-        elif base in ('GArray', 'GPtrArray',
-                      'GLib.Array', 'GLib.PtrArray',
-                      'GObject.Array', 'GObject.PtrArray'):
-            if '.' in base:
-                name = 'GLib.' + base.split('.', 1)[1]
-            else:
-                name = 'GLib.' + base[1:]
-            ctype = 'G' + name.split('.', 1)[1]
-            ctype += '*'
-        elif base in ('GHashTable', 'GLib.HashTable', 'GObject.HashTable'):
-            name = 'GLib.HashTable'
-            ctype = 'GHashTable'
-            ctype += '*'
-
-        if ctype is not None:
-            ctype = const_prefix + ctype
-        return (name, ctype)
-
-    def _type_to_key(self, typeval, transfer="full", is_return=False):
-        name = None
-        if isinstance(typeval, ast.Array):
-            if typeval.array_type != ast.Array.C:
-                name = typeval.array_type
-            else:
-                if typeval.complete_ctype:
-                    name = typeval.complete_ctype
-                elif typeval.ctype:
-                    name = typeval.ctype
-                else:
-                    # Make array type from element type
-                    if typeval.element_type.target_giname:
-                        name = self._type_to_name(typeval.element_type)
-                    elif typeval.element_type.target_fundamental:
-                        name = typeval.element_type.target_fundamental
-                    name = _get_array_type(typeval.element_type, array_type=name, transfer=transfer, is_return=is_return)
-        elif isinstance(typeval, ast.List):
-            name = typeval.name
-        elif isinstance(typeval, ast.Map):
-            name = 'GLib.HashTable'
-        else:
-            if typeval.target_giname:
-                name = self._type_to_name(typeval)
-            elif typeval.target_fundamental:
-                name = typeval.target_fundamental
-        return name
-
-    def _get_element_type(self, parent, ntype, transfer=None, is_return=False):
-        array_ctype = None
-        if parent.complete_ctype:
-            array_ctype = parent.complete_ctype
-        elif parent.ctype:
-            array_ctype = parent.ctype
-
-        element_ctype = ''
-        if array_ctype is not None:
-            element_ctype = element_ctype.join(array_ctype.rsplit(" const*", 1))
-
-        # NOTE: Cannot derive element type from GArray*
-        if element_ctype == "GArray" or element_ctype == "const gchar":
-            element_ctype = None
-
-        # check " const*"
-        if element_ctype != array_ctype:
-            return element_ctype
-
-        element_ctype = ''
-        if array_ctype is not None:
-            element_ctype = element_ctype.join(array_ctype.rsplit("*", 1))
-
-        # NOTE: Cannot derive element type from GArray*
-        if element_ctype == "GArray" or element_ctype == "const gchar":
-            element_ctype = None
-
-        # check "*"
-        if element_ctype != array_ctype:
-            return element_ctype
-
-        return None
-
     def _write_type_ref(self, ntype):
         """ Like _write_type, but only writes the type name rather than the full details """
         assert isinstance(ntype, ast.Type), ntype
@@ -632,92 +782,9 @@ class GIRWriter(XMLWriter):
     def _write_type(self, ntype, transfer=None, relation=None, parent=None, is_return=False):
         assert isinstance(ntype, ast.Type), ntype
         attrs = []
-        is_set_ctype = False
-        is_element_type_ = False
-        if parent is not None and isinstance(parent, ast.Array):
-            is_element_type_ = True
-        if isinstance(ntype, ast.Array) and ntype.complete_ctype is None and ntype.ctype is None:
-            name = ''
-            if ntype.array_type != ast.Array.C:
-                name = ntype.array_type
-            elif ntype.element_type.target_giname:
-                name = self._type_to_name(ntype.element_type)
-            elif ntype.element_type.target_fundamental:
-                name = ntype.element_type.target_fundamental
-            # NOTE: Update missing array ctype so element ctype can be added if it is missing
-            ntype.ctype = _get_array_type(ntype.element_type, array_type=name, transfer=transfer)
-            attrs.append(('c:type', ntype.ctype))
-            is_set_ctype = True
-        elif ntype.complete_ctype:
-            # Canonicalize GObject. and GLib. types
-            name_ = None
-            ctype_ = None
-            is_const_ = ntype.is_const
-            is_out_ = False
-            if ntype.complete_ctype.startswith('const '):
-                is_const_ = True
-            if ntype.complete_ctype.endswith('**'):
-                is_out_ = True
-            if hasattr(ntype, 'name') and ntype.name:
-                name_ = ntype.name
-            elif hasattr(ntype, 'gtype_name') and ntype.gtype_name:
-                name_ = ntype.gtype_name
-            elif ntype.target_giname:
-                name_ = self._type_to_name(ntype)
-            elif ntype.target_fundamental:
-                name_ = ntype.target_fundamental
-            #self._append_debug(attrs, 'is_element_type_: ' + str(is_element_type_))    
-            name_, ctype_ = self._canonicalize_ctype(name_, is_const_, is_element_type_)
-            if name_ is not None:
-                ntype.name = name_
-            if ctype_ is not None and ntype.complete_ctype != 'gpointer':
-                if is_out_ == True:
-                    ctype_ += '*'
-                ntype.complete_ctype = ctype_
-            # Add ctype to symbol table; ctype may not be set for the same type in other instances
-            symbol_ = self._type_to_key(ntype, transfer, is_return)
-            if symbol_ is not None:
-                self._add_symbol(symbol_, transfer, is_return, value=ntype.complete_ctype)
-            attrs.append(('c:type', ntype.complete_ctype))
-            is_set_ctype = True
-        elif ntype.ctype:
-            # Canonicalize GObject. and GLib. types
-            name_ = None
-            ctype_ = None
-            is_const_ = ntype.is_const
-            is_out_ = False
-            if ntype.ctype.startswith('const '):
-                is_const_ = True
-            if ntype.ctype.endswith('**'):
-                is_out_ = True
-            if hasattr(ntype, 'name') and ntype.name:
-                name_ = ntype.name
-            elif hasattr(ntype, 'gtype_name') and ntype.gtype_name:
-                name_ = ntype.gtype_name
-            elif ntype.target_giname:
-                name_ = self._type_to_name(ntype)
-            elif ntype.target_fundamental:
-                name_ = ntype.target_fundamental
-            #self._append_debug(attrs, 'is_element_type_: ' + str(is_element_type_))    
-            name_, ctype_ = self._canonicalize_ctype(name_, is_const_, is_element_type_)
-            if name_ is not None:
-                ntype.name = name_
-            if ctype_ is not None and ntype.ctype != 'gpointer':
-                if is_out_ == True:
-                    ctype_ += '*'
-                ntype.ctype = ctype_
-            # Add ctype to symbol table; ctype may not be set for the same type in other instances
-            symbol_ = self._type_to_key(ntype, transfer, is_return)
-            if symbol_ is not None:
-                self._add_symbol(symbol_, transfer, is_return, value=ntype.ctype)
-            attrs.append(('c:type', ntype.ctype))
-            is_set_ctype = True
-        elif parent:
-            if isinstance(parent, ast.Array):
-                ctype_ = self._get_element_type(parent, ntype, transfer, is_return)
-                if ctype_ is not None:
-                    attrs.append(('c:type', ctype_))
-                    is_set_ctype = True
+        (is_set_ctype, ctype_) = self._resolve_type_ctype(ntype, transfer, parent, is_return)
+        if is_set_ctype == True:
+            attrs.append(('c:type', ctype_))
         if isinstance(ntype, ast.Varargs):
             self.write_tag('varargs', [])
         elif isinstance(ntype, ast.Array):
@@ -757,28 +824,10 @@ class GIRWriter(XMLWriter):
         else:
             if is_set_ctype == False:
                 ctype = None
-                # Check if type had a ctype set correctly previously
+                # Check if type had a ctype set correctly anywhere in the namespace
                 symbol_ = self._type_to_key(ntype, transfer)
                 if symbol_ is not None:
-                    (symbol_key_, ctype_list) = self._find_symbol(symbol_, transfer, is_return)
-                    if ctype_list is None:
-                        # Check if type had a ctype set correctly as a return type
-                        (symbol_key_, ctype_list) = self._find_symbol(symbol_, transfer, True)
-                        if ctype_list is None:
-                            (symbol_key_, ctype_list) = self._find_symbol(symbol_, transfer, True)
-                            pass
-                        elif len(ctype_list) > 1:
-                            ctype = "|".join(ctype_list)
-                        elif len(ctype_list) == 1:
-                            ctype = ctype_list[0]
-                        else:
-                            ctype = "none"
-                    elif len(ctype_list) > 1:
-                        ctype = "|".join(ctype_list)
-                    elif len(ctype_list) == 1:
-                        ctype = ctype_list[0]
-                    else:
-                        ctype = "none"
+                    ctype = self._find_symbol(symbol_, transfer, is_return)
                 else:
                     name = None
                     if ntype.target_giname:
@@ -1062,3 +1111,51 @@ class GIRWriter(XMLWriter):
             self._write_generic(signal)
             self._write_return_type(signal.retval)
             self._write_parameters(signal)
+
+class SymbolCollector(GIRWriter):
+    """Walks a namespace with GIRWriter's traversal, without writing
+    anything, and records the C type of every type reference in
+    symbol_index."""
+
+    def __init__(self, namespace, symbol_index=None, nodes=None):
+        XMLWriter.__init__(self)
+        if symbol_index is None:
+            self.symbol_index = SymbolIndex()
+        else:
+            self.symbol_index = symbol_index
+        self.exclude_registered = set()
+        self.sources_roots = []
+        self.identifier_converter = _default_identifier_converter
+        self._nodes = nodes
+        self.stats = None
+        self._namespace = namespace
+        self._write_namespace(namespace)
+        self._namespace = None
+
+    def push_tag(self, tag_name, attributes=None):
+        pass
+
+    def pop_tag(self):
+        pass
+
+    def write_tag(self, tag_name, attributes, data=None):
+        pass
+
+    def _find_symbol(self, name, transfer="none", is_return=False):
+        # C types are only looked up once every symbol is collected
+        return None
+
+    def _resolve_type_ctype(self, ntype, transfer=None, parent=None, is_return=False):
+        # Only C types read from the GIR file are recorded, not inferred ones
+        has_ctype = bool(ntype.complete_ctype or ntype.ctype)
+        (is_set_ctype, ctype) = super(SymbolCollector, self)._resolve_type_ctype(ntype, transfer, parent, is_return)
+        if has_ctype == True:
+            symbol = self._type_to_key(ntype, transfer, is_return)
+            if symbol is not None:
+                self.symbol_index.add(symbol, transfer, is_return, value=ctype)
+        return (is_set_ctype, ctype)
+
+def collect_symbols(namespace, symbol_index=None, nodes=None):
+    """Returns a SymbolIndex of the C types used in namespace, or in nodes
+    when the namespace is being streamed."""
+    return SymbolCollector(namespace, symbol_index, nodes).symbol_index
@@ -0,0 +1,123 @@
+# -*- Mode: Python -*-
+# Copyright (C) 2019 Rene Sugar
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+#
+
+import os
+
+# Prefix aliases and get_type rules used when no --identifierrules file is given
+DEFAULT_IDENTIFIER_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                             'config', 'identifier-rules.txt')
+
+_default_identifier_rules = None
+
+def _add_prefix(identifier, prefix):
+    if identifier.startswith(prefix) == False:
+        if identifier[0].isupper():
+            identifier = prefix + identifier
+        else:
+            identifier = prefix + "_" + identifier
+    return identifier
+
+class IdentifierConverter(object):
+    """Converts GIR names to GLib type names and get_type symbols.
+
+    Results are memoized per (name, identifier prefix), so one converter
+    can be shared by every file in a run.
+    """
+
+    def __init__(self, rules=None, prefix_aliases=None):
+        if rules is None or prefix_aliases is None:
+            default_rules, default_prefix_aliases = _load_default_rules()
+            if rules is None:
+                rules = default_rules
+            if prefix_aliases is None:
+                prefix_aliases = default_prefix_aliases
+        self.rules = list(rules)
+        self.prefix_aliases = dict(prefix_aliases)
+        self._type_name_cache = {}
+        self._get_type_cache = {}
+
+    def type_name(self, name, identifier_prefix):
+        key = (name, identifier_prefix)
+        type_name = self._type_name_cache.get(key)
+        if type_name is None:
+            identifier_prefix = self.prefix_aliases.get(identifier_prefix, identifier_prefix)
+            type_name = _add_prefix(name, identifier_prefix)
+            self._type_name_cache[key] = type_name
+        return type_name
+
+    def get_type(self, name, identifier_prefix):
+        key = (name, identifier_prefix)
+        get_type = self._get_type_cache.get(key)
+        if get_type is None:
+            get_type = self._convert_get_type(name, identifier_prefix)
+            self._get_type_cache[key] = get_type
+        return get_type
+
+    def _convert_get_type(self, name, identifier_prefix):
+        identifier_prefix = self.prefix_aliases.get(identifier_prefix, identifier_prefix)
+        name = _add_prefix(name, identifier_prefix)
+
+        get_type = ''.join('_' + char.lower() if char.isupper() else char for char in name).lstrip('_')
+        get_type += '_get_type'
+
+        for match, old, new in self.rules:
+            if match == 'any':
+                get_type = get_type.replace(old, new)
+            elif match == 'startswith':
+                if get_type.startswith(old):
+                    get_type = get_type.replace(old, new)
+            elif match == 'prefix:' + identifier_prefix:
+                get_type = get_type.replace(old, new)
+        return get_type
+
+def _read_identifier_rules(filename):
+    rules = []
+    prefix_aliases = {}
+    with open(filename, "r") as rules_file:
+        for line_number, line in enumerate(rules_file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split()
+            if len(fields) != 3:
+                raise ValueError('%s:%d: expected "<match> <old> <new>"' % (filename, line_number))
+            match, old, new = fields
+            if match == 'alias':
+                prefix_aliases[old] = new
+            elif match in ('any', 'startswith') or match.startswith('prefix:'):
+                rules.append((match, old, new))
+            else:
+                raise ValueError('%s:%d: unknown match "%s"' % (filename, line_number, match))
+    return (rules, prefix_aliases)
+
+def _load_default_rules():
+    global _default_identifier_rules
+    if _default_identifier_rules is None:
+        _default_identifier_rules = _read_identifier_rules(DEFAULT_IDENTIFIER_RULES_FILE)
+    return _default_identifier_rules
+
+def load_identifier_rules(filename):
+    """Reads prefix aliases and get_type rules from filename.
+
+    Each line is "<match> <old> <new>", where match is "any", "startswith",
+    "prefix:<Prefix>" or "alias" (use <new> as the identifier prefix in place
+    of <old>). Blank lines and lines starting with "#" are ignored.
+    """
+    rules, prefix_aliases = _read_identifier_rules(filename)
+    return IdentifierConverter(rules, prefix_aliases)
@@ -0,0 +1,74 @@
+# -*- Mode: Python -*-
+# Copyright (C) 2019 Rene Sugar
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+import json
+import os
+import tempfile
+
+from parsecache import file_digest
+
+MANIFEST_FILENAME = '.gircheck-manifest.json'
+
+# Bump this for *incompatible* changes to the manifest layout
+MANIFEST_VERSION = 1
+
+class BuildManifest(object):
+    """Records input, option and output hashes for each file in an output
+    directory so unchanged files can be skipped on the next run."""
+
+    def __init__(self, output_path):
+        self.filename = os.path.join(output_path, MANIFEST_FILENAME)
+        self._entries = {}
+
+    def load(self):
+        try:
+            with open(self.filename, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == MANIFEST_VERSION:
+            self._entries = data.get('files', {})
+
+    def save(self):
+        data = {'version': MANIFEST_VERSION, 'files': self._entries}
+        output_path = os.path.dirname(self.filename)
+        fd, tmp_filename = tempfile.mkstemp(dir=output_path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write('\n')
+        os.replace(tmp_filename, self.filename)
+
+    def is_current(self, output_filename, input_digest, options_digest):
+        entry = self._entries.get(os.path.basename(output_filename))
+        if entry is None:
+            return False
+        if entry['input_digest'] != input_digest or entry['options_digest'] != options_digest:
+            return False
+        # The output may have been edited or removed since it was written
+        if not os.path.exists(output_filename):
+            return False
+        return file_digest(output_filename) == entry['output_digest']
+
+    def update(self, output_filename, input_filename, input_digest, options_digest):
+        self._entries[os.path.basename(output_filename)] = {
+            'input': input_filename,
+            'input_digest': input_digest,
+            'options_digest': options_digest,
+            'output_digest': file_digest(output_filename),
+        }
@@ -0,0 +1,83 @@
+# -*- Mode: Python -*-
+# Copyright (C) 2019 Rene Sugar
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+import json
+import sys
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Bump this for *incompatible* changes to the memory report
+MEMORY_REPORT_VERSION = 1
+
+# Rough ratio of memory used by a parsed and rewritten GIR file to its size
+# on disk; used to choose the streaming path before running out of memory
+MEMORY_PER_INPUT_BYTE = 30
+
+def peak_rss_kb():
+    """Returns the peak resident set size of this process in kilobytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        peak //= 1024
+    return peak
+
+def set_memory_limit(limit_bytes):
+    """Limits the address space of this process and the workers it starts,
+    so running out of memory raises MemoryError instead of the process
+    being killed. Returns False if the platform has no such limit."""
+    if resource is None or not hasattr(resource, 'RLIMIT_AS'):
+        return False
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit_bytes = min(limit_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, hard))
+    return True
+
+class MemoryTracker(object):
+    """Records memory use for each phase of processing one input file.
+
+    traced_peak is the peak size of the Python allocations made during the
+    phase (tracemalloc), rss_peak_kb the peak RSS of the process so far.
+    """
+
+    def __init__(self):
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, phase):
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.phases[phase] = {'traced_peak': peak, 'rss_peak_kb': peak_rss_kb()}
+
+def save_memory_report(filename, files):
+    data = {'version': MEMORY_REPORT_VERSION, 'files': files}
+    with open(filename, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,99 @@
+# -*- Mode: Python -*-
+# Copyright (C) 2019 Rene Sugar
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+import giscanner
+from giscanner.girparser import GIRParser
+
+# Bump this for changes to what is stored in the cache
+CACHE_FORMAT_VERSION = '1'
+
+def file_digest(path):
+    """Returns the hex sha256 digest of the contents of path."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ParseCache(object):
+    """On-disk cache of parsed ast.Namespace objects.
+
+    Entries are keyed by the content hash of the GIR file and the giscanner
+    version, so a stale entry is never returned for a changed file.
+    """
+
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+
+    def _cache_filename(self, path):
+        key = hashlib.sha256()
+        key.update(file_digest(path).encode('utf-8'))
+        key.update(giscanner.__version__.encode('utf-8'))
+        key.update(CACHE_FORMAT_VERSION.encode('utf-8'))
+        key.update(('%d.%d' % sys.version_info[:2]).encode('utf-8'))
+        filename = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_path, '%s-%s.pickle' % (filename, key.hexdigest()))
+
+    def _load(self, cache_filename):
+        try:
+            with open(cache_filename, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # Missing or unreadable entry; parse the file again
+            return None
+
+    def _store(self, cache_filename, namespace):
+        # Write to a temporary file first so concurrent runs never read
+        # a partially written entry
+        tmp_filename = None
+        try:
+            os.makedirs(self.cache_path, exist_ok=True)
+            fd, tmp_filename = tempfile.mkstemp(dir=self.cache_path, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(namespace, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_filename, cache_filename)
+            tmp_filename = None
+        except (OSError, pickle.PicklingError) as e:
+            # The cache is only an optimization, the namespace is still used
+            sys.stderr.write('WARNING: Unable to cache %s: %s\n' % (cache_filename, e))
+        finally:
+            if tmp_filename is not None:
+                try:
+                    os.unlink(tmp_filename)
+                except OSError:
+                    pass
+
+    def get_namespace(self, path):
+        cache_filename = self._cache_filename(path)
+        namespace = self._load(cache_filename)
+        if namespace is not None:
+            return namespace
+
+        parser = GIRParser()
+        parser.parse(path)
+        namespace = parser.get_namespace()
+
+        self._store(cache_filename, namespace)
+        return namespace
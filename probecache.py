@@ -0,0 +1,124 @@
+# -*- Mode: Python -*-
+# Copyright (C) 2019 Rene Sugar
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+import hashlib
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+
+from parsecache import file_digest
+
+PROBE_NAME = 'girtypes'
+
+# Bump this for changes to how probe programs are keyed
+PROBE_CACHE_VERSION = '1'
+
+def write_if_changed(filename, data):
+    """Writes data to filename unless the file already contains exactly
+    data, so unchanged generated sources keep their mtime and do not
+    trigger a rebuild. Returns True if the file was written."""
+    try:
+        if os.path.getsize(filename) == len(data):
+            with open(filename, 'rb') as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    with open(filename, 'wb') as f:
+        f.write(data)
+    return True
+
+def _pkg_versions(packages):
+    # The probe links against these, so upgrading a library changes the key
+    if len(packages) == 0:
+        return ''
+    try:
+        return subprocess.check_output(['pkg-config', '--modversion'] + sorted(packages),
+                                       stderr=subprocess.DEVNULL).decode('utf-8')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def probe_digest(source_path, filenames, packages):
+    """Returns the cache key of the probe built from filenames (relative to
+    source_path) against the pkg-config packages, or None if the package
+    versions are unknown."""
+    pkg_versions = _pkg_versions(packages)
+    if pkg_versions is None:
+        return None
+    key = hashlib.sha256()
+    key.update(PROBE_CACHE_VERSION.encode('utf-8'))
+    key.update(platform.platform().encode('utf-8'))
+    # The default exclude-gtypes.txt path is compiled into the probe
+    key.update(os.path.abspath(source_path).encode('utf-8'))
+    key.update(pkg_versions.encode('utf-8'))
+    for filename in sorted(filenames):
+        key.update(filename.encode('utf-8'))
+        key.update(file_digest(os.path.join(source_path, filename)).encode('utf-8'))
+    return key.hexdigest()
+
+def _copy_executable(src, dst):
+    # Copy to a temporary file first so concurrent runs never run a
+    # partially copied program
+    fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(dst), suffix='.tmp')
+    os.close(fd)
+    try:
+        shutil.copy2(src, tmp_filename)
+        os.replace(tmp_filename, dst)
+    except OSError:
+        os.unlink(tmp_filename)
+        raise
+
+class ProbeCache(object):
+    """On-disk cache of built probe programs, keyed by probe_digest(), so
+    regenerating unchanged sources reuses the previous executable."""
+
+    def __init__(self, cache_path):
+        self.cache_path = os.path.join(cache_path, 'probes')
+
+    def _cache_filename(self, key):
+        return os.path.join(self.cache_path, '%s-%s' % (PROBE_NAME, key))
+
+    def restore(self, key, probe_filename):
+        cache_filename = self._cache_filename(key)
+        if not os.path.exists(cache_filename):
+            return False
+        if os.path.exists(probe_filename) and file_digest(probe_filename) == file_digest(cache_filename):
+            return True
+        _copy_executable(cache_filename, probe_filename)
+        return True
+
+    def store(self, key, probe_filename):
+        os.makedirs(self.cache_path, exist_ok=True)
+        _copy_executable(probe_filename, self._cache_filename(key))
+
+def build_probe(source_path, build_path, key=None, cache=None):
+    """Builds the probe generated in source_path with CMake in build_path,
+    unless cache has one with the same key. Returns the probe filename and
+    whether it came from the cache."""
+    os.makedirs(build_path, exist_ok=True)
+    probe_filename = os.path.join(build_path, PROBE_NAME)
+    if cache is not None and cache.restore(key, probe_filename):
+        return probe_filename, True
+    subprocess.check_call(['cmake', os.path.abspath(source_path)], cwd=build_path)
+    subprocess.check_call(['cmake', '--build', '.'], cwd=build_path)
+    if cache is not None:
+        cache.store(key, probe_filename)
+    return probe_filename, False
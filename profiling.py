@@ -0,0 +1,64 @@
+# -*- Mode: Python -*-
+# Copyright (C) 2019 Rene Sugar
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
+# 02110-1301, USA.
+#
+
+import cProfile
+import io
+import os
+import pstats
+from contextlib import contextmanager
+
+# Number of functions listed per phase in the text summary
+PROFILE_TOP_FUNCTIONS = 30
+
+class PhaseProfiler(object):
+    """Profiles each phase of processing one input file separately.
+
+    Every phase is dumped to <output_path>/<name>-<phase>.pstats and
+    write_summary() writes the top functions of all phases, sorted by
+    cumulative time, to <output_path>/<name>.txt.
+    """
+
+    def __init__(self, output_path, name, top=PROFILE_TOP_FUNCTIONS):
+        self.output_path = output_path
+        self.name = name
+        self.top = top
+        self._phases = []
+
+    def pstats_filename(self, phase):
+        return os.path.join(self.output_path, '%s-%s.pstats' % (self.name, phase))
+
+    @contextmanager
+    def phase(self, phase):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(self.pstats_filename(phase))
+            self._phases.append((phase, profile))
+
+    def write_summary(self):
+        summary = io.StringIO()
+        for phase, profile in self._phases:
+            summary.write('==== %s: %s ====\n' % (self.name, phase))
+            stats = pstats.Stats(profile, stream=summary)
+            stats.sort_stats('cumulative').print_stats(self.top)
+        with open(os.path.join(self.output_path, self.name + '.txt'), 'w') as o:
+            o.write(summary.getvalue())
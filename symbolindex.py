@@ -0,0 +1,207 @@
+# -*- Mode: Python -*-
+# Copyright (C) 2019 Rene Sugar
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+#
+
+import hashlib
+import json
+import os
+import tempfile
+
+# Bump this for *incompatible* changes to the persisted index
+SYMBOL_INDEX_VERSION = 1
+
+# Sources whose changes can change the symbols collected from a file
+COLLECTOR_SOURCES = ['girwriter.py', 'symbolindex.py']
+
+def collector_digest():
+    """Returns the hex sha256 digest of the symbol collector sources."""
+    digest = hashlib.sha256()
+    tool_path = os.path.dirname(os.path.abspath(__file__))
+    for filename in COLLECTOR_SOURCES:
+        with open(os.path.join(tool_path, filename), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+class SymtableKey(object):
+    """Immutable symbol table key; the hash is computed once since every
+    lookup hashes the key."""
+
+    __slots__ = ('name', 'transfer', 'is_return', '_hash')
+
+    def __init__(self, name, transfer, is_return):
+        self.name = name
+        self.transfer = transfer
+        self.is_return = is_return
+        self._hash = hash((name, transfer, is_return))
+
+    def __eq__(self, other):
+        if not isinstance(other, SymtableKey):
+            return NotImplemented
+        return (self.name == other.name and self.transfer == other.transfer and
+                self.is_return == other.is_return)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # String hashes differ between processes, so do not pickle _hash
+        return (SymtableKey, (self.name, self.transfer, self.is_return))
+
+    def __repr__(self):
+        return 'SymtableKey(name=%r, transfer=%r, is_return=%r)' % (self.name, self.transfer, self.is_return)
+
+class SymbolIndex(object):
+    """Maps a type name, transfer and return flag to the C types seen for it.
+
+    Names of non-fundamental types are namespace qualified (e.g.
+    "GLib.Variant") so one index can be shared by all files in a run.
+    """
+
+    def __init__(self):
+        self.symbol_table = {}
+
+    def __len__(self):
+        return len(self.symbol_table)
+
+    def find(self, name, transfer="none", is_return=False):
+        key = SymtableKey(name=name, transfer=transfer, is_return=is_return)
+        return (key, self.symbol_table.get(key))
+
+    def add(self, name, transfer="none", is_return=False, value=None):
+        if value is None:
+            return
+        (key, ctype) = self.find(name, transfer, is_return)
+        if ctype is None:
+            self.symbol_table[key] = [value]
+        elif value not in ctype:
+            ctype.append(value)
+
+    def update(self, other):
+        for key, ctypes in other.symbol_table.items():
+            for value in ctypes:
+                self.add(key.name, key.transfer, key.is_return, value=value)
+
+    def finalize(self):
+        """Returns a read-only CtypeTable of this index.
+
+        When several C types were seen for one key the first one collected
+        is used, and parameter lookups fall back to C types only seen on
+        return values.
+        """
+        table = {False: {}, True: {}}
+        ambiguous = set()
+        for key, ctypes in self.symbol_table.items():
+            ctypes_by_name = table[key.is_return].setdefault(key.transfer, {})
+            ctypes_by_name[key.name] = ctypes[0]
+            if len(ctypes) > 1:
+                ambiguous.add((key.is_return, key.transfer, key.name))
+        fallbacks = set()
+        for transfer, return_ctypes in table[True].items():
+            ctypes_by_name = table[False].setdefault(transfer, {})
+            for name, ctype in return_ctypes.items():
+                if name not in ctypes_by_name:
+                    ctypes_by_name[name] = ctype
+                    fallbacks.add((transfer, name))
+                    if (True, transfer, name) in ambiguous:
+                        ambiguous.add((False, transfer, name))
+        return CtypeTable(table, fallbacks, ambiguous, self.digest())
+
+    def to_list(self):
+        # transfer may be None, so it cannot be compared directly
+        return sorted(([key.name, key.transfer, key.is_return, list(ctypes)]
+                       for key, ctypes in self.symbol_table.items()),
+                      key=lambda entry: (entry[0], entry[1] or '', entry[2]))
+
+    @classmethod
+    def from_list(cls, entries):
+        index = cls()
+        for name, transfer, is_return, ctypes in entries:
+            for value in ctypes:
+                index.add(name, transfer, is_return, value=value)
+        return index
+
+    def digest(self):
+        data = json.dumps(self.to_list(), sort_keys=True).encode('utf-8')
+        return hashlib.sha256(data).hexdigest()
+
+class CtypeTable(object):
+    """Flat {is_return: {transfer: {name: ctype}}} lookup table built by
+    SymbolIndex.finalize(); it is not changed after it is built, so one
+    table can be used by every writer of a run."""
+
+    def __init__(self, table, fallbacks, ambiguous, digest):
+        self._table = table
+        # (transfer, name) of parameter entries taken from return values
+        self.fallbacks = fallbacks
+        # (is_return, transfer, name) of entries that had several C types
+        self.ambiguous = ambiguous
+        self._digest = digest
+
+    def find(self, name, transfer="none", is_return=False):
+        ctypes_by_name = self._table[is_return].get(transfer)
+        if ctypes_by_name is None:
+            return None
+        return ctypes_by_name.get(name)
+
+    def digest(self):
+        return self._digest
+
+class SymbolIndexFile(object):
+    """Persists the symbols collected from each GIR file, keyed by the file's
+    content hash and the collector sources, so only changed files are
+    collected again."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._files = {}
+        self._collector = collector_digest()
+
+    def load(self):
+        try:
+            with open(self.filename, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == SYMBOL_INDEX_VERSION:
+            self._files = data.get('files', {})
+
+    def save(self):
+        data = {'version': SYMBOL_INDEX_VERSION, 'files': self._files}
+        output_path = os.path.dirname(os.path.abspath(self.filename))
+        fd, tmp_filename = tempfile.mkstemp(dir=output_path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, sort_keys=True)
+            f.write('\n')
+        os.replace(tmp_filename, self.filename)
+
+    def get(self, path, digest):
+        entry = self._files.get(path)
+        if entry is None or entry['digest'] != digest:
+            return None
+        if entry.get('collector') != self._collector:
+            return None
+        return SymbolIndex.from_list(entry['symbols'])
+
+    def put(self, path, digest, index):
+        self._files[path] = {'digest': digest, 'collector': self._collector, 'symbols': index.to_list()}
@@ -0,0 +1,92 @@
+# -*- Mode: Python -*-
+# Copyright (C) 2019 Rene Sugar
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the
+# Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+# Boston, MA 02111-1307, USA.
+#
+
+import json
+
+# Bump this for *incompatible* changes to the stats file
+WRITER_STATS_VERSION = 1
+
+def _new_node_stats():
+    return {'count': 0, 'time': 0.0, 'output_size': 0}
+
+def _merge_node_stats(nodes, other_nodes):
+    for kind, other_stats in other_nodes.items():
+        node_stats = nodes.setdefault(kind, _new_node_stats())
+        for field, value in other_stats.items():
+            node_stats[field] += value
+
+def _merge_counters(counters, other_counters):
+    for counter, value in other_counters.items():
+        counters[counter] = counters.get(counter, 0) + value
+
+class WriterStats(object):
+    """Accumulates per namespace GIRWriter timings, keyed by node kind.
+
+    For every top-level node kind (the AST class name, e.g. "Function" or
+    "Class") it records the number of nodes written, the time spent writing
+    them and the size of the XML text they produced, in characters.
+
+    Hot path counters of the C type resolution (symbol lookups,
+    canonicalization rewrites, element type derivations) are kept per
+    namespace as well, see increment().
+    """
+
+    def __init__(self):
+        self.namespaces = {}
+
+    def _namespace_stats(self, namespace_name):
+        stats = self.namespaces.get(namespace_name)
+        if stats is None:
+            stats = self.namespaces[namespace_name] = {'nodes': {}, 'counters': {}}
+        return stats
+
+    def add_node(self, namespace_name, kind, elapsed, output_size):
+        nodes = self._namespace_stats(namespace_name)['nodes']
+        node_stats = nodes.get(kind)
+        if node_stats is None:
+            node_stats = nodes[kind] = _new_node_stats()
+        node_stats['count'] += 1
+        node_stats['time'] += elapsed
+        node_stats['output_size'] += output_size
+
+    def increment(self, namespace_name, counter, amount=1):
+        counters = self._namespace_stats(namespace_name)['counters']
+        counters[counter] = counters.get(counter, 0) + amount
+
+    def update(self, other):
+        for namespace_name, other_stats in other.namespaces.items():
+            stats = self._namespace_stats(namespace_name)
+            _merge_node_stats(stats['nodes'], other_stats['nodes'])
+            _merge_counters(stats['counters'], other_stats['counters'])
+
+    def to_dict(self):
+        totals = {'nodes': {}, 'counters': {}}
+        for stats in self.namespaces.values():
+            _merge_node_stats(totals['nodes'], stats['nodes'])
+            _merge_counters(totals['counters'], stats['counters'])
+        return {
+            'version': WRITER_STATS_VERSION,
+            'namespaces': self.namespaces,
+            'totals': totals,
+        }
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+            f.write('\n')